@@ -4,9 +4,21 @@ Multi-Agent Coordination
 This module provides utilities for implementing multi-agent coordination patterns.
 """
 
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Any, Optional
+from abc import ABC, abstractmethod
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+from dataclasses import asdict, dataclass, field
 from enum import Enum
+import asyncio
+import heapq
+import itertools
+import json
+import multiprocessing
+import pickle
+import queue
+import random
+import threading
 import time
 import uuid
 
@@ -30,29 +42,228 @@ class AgentMessage:
     message_id: str = field(default_factory=lambda: str(uuid.uuid4()))
     requires_response: bool = False
     priority: int = 0  # 0 = normal, higher = more urgent
+    correlation_id: Optional[str] = None  # message_id this one replies to
+    
+    def to_dict(self) -> Dict:
+        """JSON-serializable form of the message."""
+        data = asdict(self)
+        data["message_type"] = self.message_type.value
+        return data
+
+
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "reject")
+
+
+class PriorityInbox:
+    """
+    Bounded per-agent inbox delivering the most urgent messages first.
+    
+    Messages are popped by descending priority, FIFO within a priority.
+    When the inbox holds capacity messages, the backpressure policy decides
+    what happens to a new one:
+    
+    - "block": wait up to block_timeout seconds for the receiver to make room,
+      then reject.
+    - "drop_oldest": evict the oldest message of the lowest queued priority
+      (or drop the new message if it is less urgent than everything queued).
+    - "reject": refuse the new message.
+    
+    Both orderings are kept as heaps over a shared live-message table, so
+    push, pop and eviction are O(log n); stale heap entries are skipped
+    lazily and compacted when they outnumber live ones.
+    """
+    
+    def __init__(self, capacity: int = 1000, policy: str = "drop_oldest",
+                 block_timeout: float = 1.0):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._live: Dict[int, AgentMessage] = {}
+        self._urgent: List[tuple] = []  # (-priority, seq)
+        self._victims: List[tuple] = []  # (priority, seq)
+        self._sequence = itertools.count()
+        self._changed = threading.Condition()
+        self.stats = {"delivered": 0, "received": 0, "dropped": 0, "rejected": 0}
+    
+    def __len__(self) -> int:
+        return len(self._live)
+    
+    def put(self, message: AgentMessage) -> bool:
+        """Queue a message; returns False if backpressure refused it."""
+        with self._changed:
+            if len(self._live) >= self.capacity:
+                if self.policy == "block":
+                    self._changed.wait_for(
+                        lambda: len(self._live) < self.capacity, self.block_timeout
+                    )
+                elif self.policy == "drop_oldest":
+                    if not self._evict_for(message.priority):
+                        self.stats["dropped"] += 1
+                        return False
+                if len(self._live) >= self.capacity:
+                    self.stats["rejected"] += 1
+                    return False
+            
+            seq = next(self._sequence)
+            self._live[seq] = message
+            heapq.heappush(self._urgent, (-message.priority, seq))
+            heapq.heappush(self._victims, (message.priority, seq))
+            self.stats["delivered"] += 1
+            self._changed.notify_all()
+            return True
+    
+    def pop_many(self, max_messages: int = None,
+                 timeout: float = None) -> List[AgentMessage]:
+        """
+        Remove and return up to max_messages messages, most urgent first.
+        
+        With a timeout, waits up to that many seconds for a message to arrive.
+        """
+        with self._changed:
+            if timeout:
+                self._changed.wait_for(lambda: self._live, timeout)
+            messages = []
+            while self._live and (max_messages is None or len(messages) < max_messages):
+                _, seq = heapq.heappop(self._urgent)
+                message = self._live.pop(seq, None)
+                if message is not None:
+                    messages.append(message)
+            if not self._live:
+                self._urgent.clear()
+                self._victims.clear()
+            self._compact()
+            self.stats["received"] += len(messages)
+            if messages:
+                self._changed.notify_all()
+            return messages
+    
+    def take(self, predicate: Callable[[AgentMessage], bool],
+             timeout: float = None) -> Optional[AgentMessage]:
+        """
+        Remove and return the most urgent message matching predicate,
+        leaving all other messages queued. With a timeout, waits up to that
+        many seconds for a matching message to arrive.
+        """
+        def find() -> Optional[int]:
+            matches = [seq for seq, message in self._live.items() if predicate(message)]
+            return min(matches, key=lambda seq: (-self._live[seq].priority, seq), default=None)
+        
+        with self._changed:
+            seq = find()
+            if seq is None and timeout:
+                deadline = time.monotonic() + timeout
+                while seq is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._changed.wait(remaining):
+                        seq = find()
+                        break
+                    seq = find()
+            if seq is None:
+                return None
+            message = self._live.pop(seq)
+            self._compact()
+            self.stats["received"] += 1
+            self._changed.notify_all()
+            return message
+    
+    def _evict_for(self, priority: int) -> bool:
+        """Drop the oldest lowest-priority message to admit one of priority."""
+        while self._victims:
+            lowest, seq = self._victims[0]
+            if seq not in self._live:
+                heapq.heappop(self._victims)
+                continue
+            if priority < lowest:
+                return False
+            heapq.heappop(self._victims)
+            del self._live[seq]
+            self.stats["dropped"] += 1
+            return True
+        return False
+    
+    def _compact(self):
+        for name in ("_urgent", "_victims"):
+            entries = getattr(self, name)
+            if len(entries) > 2 * len(self._live) + 64:
+                entries = [entry for entry in entries if entry[1] in self._live]
+                heapq.heapify(entries)
+                setattr(self, name, entries)
 
 
 class AgentCommunication:
-    """Communication channel for multi-agent systems."""
+    """
+    Communication channel for multi-agent systems.
     
-    def __init__(self):
-        self.inbox: Dict[str, List[AgentMessage]] = {}
-        self.outbox: List[AgentMessage] = []
-        self.message_history: List[AgentMessage] = []
+    Each agent has a bounded PriorityInbox. The outbox and message history
+    are ring buffers of history_size messages; when history_path is given,
+    messages falling out of the history are appended there as JSON lines
+    instead of being forgotten.
+    """
     
-    def send(self, message: AgentMessage):
-        """Send a message to an agent."""
-        if message.receiver not in self.inbox:
-            self.inbox[message.receiver] = []
-        self.inbox[message.receiver].append(message)
-        self.outbox.append(message)
-        self.message_history.append(message)
-    
-    def receive(self, agent_id: str) -> List[AgentMessage]:
-        """Receive all messages for an agent."""
-        messages = self.inbox.get(agent_id, [])
-        self.inbox[agent_id] = []  # Clear inbox after receiving
-        return messages
+    def __init__(self, inbox_capacity: int = 1000, backpressure: str = "drop_oldest",
+                 block_timeout: float = 1.0, history_size: int = 10000,
+                 history_path: str = None):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.inbox_capacity = inbox_capacity
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.history_path = history_path
+        self.inbox: Dict[str, PriorityInbox] = {}
+        self.outbox: deque = deque(maxlen=history_size)
+        self.message_history: deque = deque(maxlen=history_size)
+        self.spilled_count = 0
+        self._history_file = None  # Append handle, opened on first spill
+        self._lock = threading.Lock()
+    
+    def _get_inbox(self, agent_id: str) -> PriorityInbox:
+        with self._lock:
+            if agent_id not in self.inbox:
+                self.inbox[agent_id] = PriorityInbox(
+                    self.inbox_capacity, self.backpressure, self.block_timeout
+                )
+            return self.inbox[agent_id]
+    
+    def send(self, message: AgentMessage) -> bool:
+        """
+        Send a message to an agent.
+        
+        Returns False if the receiver's inbox refused it under backpressure.
+        """
+        delivered = self._get_inbox(message.receiver).put(message)
+        self.log(message)
+        return delivered
+    
+    def log(self, message: AgentMessage):
+        """Record a message in the outbox and history without delivering it."""
+        with self._lock:
+            self.outbox.append(message)
+            self._record(message)
+    
+    def receive(self, agent_id: str, max_messages: int = None,
+                timeout: float = None) -> List[AgentMessage]:
+        """
+        Receive pending messages for an agent, most urgent first.
+        
+        With a timeout, blocks up to that many seconds until a message arrives.
+        """
+        inbox = self._get_inbox(agent_id) if timeout else self.inbox.get(agent_id)
+        if inbox is None:
+            return []
+        return inbox.pop_many(max_messages, timeout)
+    
+    def receive_matching(self, agent_id: str, predicate: Callable[[AgentMessage], bool],
+                         timeout: float = None) -> Optional[AgentMessage]:
+        """
+        Receive the most urgent message for an agent matching predicate,
+        waiting up to timeout seconds. Other messages stay in the inbox.
+        """
+        inbox = self._get_inbox(agent_id) if timeout else self.inbox.get(agent_id)
+        if inbox is None:
+            return None
+        return inbox.take(predicate, timeout)
     
     def broadcast(self, sender: str, message_type: MessageType, 
                   content: Dict[str, Any], receivers: List[str]):
@@ -64,6 +275,296 @@ class AgentCommunication:
                 message_type=message_type,
                 content=content
             ))
+    
+    def iter_history(self) -> Iterator[Dict]:
+        """Yield the full history as dicts: spilled messages, then in-memory ones."""
+        if self.history_path and self.spilled_count:
+            with self._lock:
+                if self._history_file is not None:
+                    self._history_file.flush()
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+        with self._lock:
+            recent = [message.to_dict() for message in self.message_history]
+        yield from recent
+    
+    def get_stats(self) -> Dict:
+        """Per-agent inbox depth and backpressure counters."""
+        return {
+            "inboxes": {
+                agent_id: {"pending": len(inbox), **inbox.stats}
+                for agent_id, inbox in self.inbox.items()
+            },
+            "history_in_memory": len(self.message_history),
+            "history_spilled": self.spilled_count
+        }
+    
+    def close(self):
+        """Flush and close the history spill file."""
+        with self._lock:
+            if self._history_file is not None:
+                self._history_file.close()
+                self._history_file = None
+    
+    def _record(self, message: AgentMessage):
+        history = self.message_history
+        if self.history_path and len(history) == history.maxlen:
+            if self._history_file is None:
+                self._history_file = open(self.history_path, 'a', encoding='utf-8')
+            self._history_file.write(json.dumps(history[0].to_dict(), default=str) + "\n")
+            self.spilled_count += 1
+        history.append(message)
+
+
+class AsyncMessageBus:
+    """
+    asyncio front end for AgentCommunication.
+    
+    receive() awaits new messages instead of polling, request() resolves
+    when the matching response arrives, and responses carrying a
+    correlation_id go straight to the waiting future rather than the
+    requester's inbox. send() and reply() may be called from other threads;
+    wakeups are marshalled onto the bus's event loop.
+    
+    The "block" backpressure policy is not supported: a full inbox would
+    wait on a threading.Condition and stall the event loop that the
+    receiver needs in order to drain it.
+    """
+    
+    def __init__(self, communication: AgentCommunication = None):
+        self.communication = communication or AgentCommunication()
+        if self.communication.backpressure == "block":
+            raise ValueError(
+                "AsyncMessageBus requires a non-blocking backpressure policy "
+                "(\"drop_oldest\" or \"reject\")"
+            )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._arrivals: Dict[str, asyncio.Event] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+    
+    def send(self, message: AgentMessage) -> bool:
+        """Deliver a message, completing a pending request if it is a reply."""
+        if message.correlation_id in self._pending:
+            self.communication.log(message)
+            self._call(self._resolve, message)
+            return True
+        delivered = self.communication.send(message)
+        if delivered:
+            self._call(self._wake, message.receiver)
+        return delivered
+    
+    def reply(self, request: AgentMessage, content: Dict[str, Any]) -> bool:
+        """Send a response correlated with request back to its sender."""
+        return self.send(AgentMessage(
+            sender=request.receiver,
+            receiver=request.sender,
+            message_type=MessageType.RESPONSE,
+            content=content,
+            correlation_id=request.message_id,
+            priority=request.priority
+        ))
+    
+    async def receive(self, agent_id: str, timeout: float = None,
+                      max_messages: int = None) -> List[AgentMessage]:
+        """Wait up to timeout seconds for messages; returns [] on timeout."""
+        self._bind()
+        deadline = None if timeout is None else self._loop.time() + timeout
+        while True:
+            messages = self.communication.receive(agent_id, max_messages)
+            if messages:
+                return messages
+            arrival = self._arrivals.setdefault(agent_id, asyncio.Event())
+            arrival.clear()
+            remaining = None if deadline is None else deadline - self._loop.time()
+            if remaining is not None and remaining <= 0:
+                return []
+            try:
+                await asyncio.wait_for(arrival.wait(), remaining)
+            except asyncio.TimeoutError:
+                return []
+    
+    async def request(self, message: AgentMessage,
+                      timeout: float = None) -> AgentMessage:
+        """
+        Send message and wait for the response correlated with it.
+        
+        Raises asyncio.TimeoutError if no response arrives within timeout,
+        and ValueError if the receiver's inbox refuses the request.
+        """
+        self._bind()
+        message.requires_response = True
+        future = self._loop.create_future()
+        self._pending[message.message_id] = future
+        try:
+            if not self.send(message):
+                raise ValueError(f"Inbox for {message.receiver} refused the request")
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(message.message_id, None)
+    
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._arrivals = {}
+    
+    def _call(self, callback, *args):
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            callback(*args)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(callback, *args)
+    
+    def _wake(self, agent_id: str):
+        arrival = self._arrivals.get(agent_id)
+        if arrival is not None:
+            arrival.set()
+    
+    def _resolve(self, message: AgentMessage):
+        future = self._pending.get(message.correlation_id)
+        if future is not None and not future.done():
+            future.set_result(message)
+
+
+# Worker Selection
+
+class WorkerSelectionPolicy(ABC):
+    """
+    Index of available workers by capability.
+    
+    SupervisorAgent reports every status change through mark_available /
+    mark_unavailable; select() then returns an available worker with the
+    given capability (None means any capability) or None. Subclasses
+    decide which one.
+    """
+    
+    def __init__(self):
+        self.capabilities: Dict[str, List[str]] = {}
+    
+    @abstractmethod
+    def mark_available(self, worker_id: str, info: Dict):
+        """Index worker_id (with its current info) as available."""
+    
+    @abstractmethod
+    def mark_unavailable(self, worker_id: str):
+        """Remove worker_id from the available set."""
+    
+    @abstractmethod
+    def select(self, capability: Optional[str]) -> Optional[str]:
+        """Return an available worker with capability, or None."""
+    
+    def _keys(self, worker_id: str) -> List[Optional[str]]:
+        return [None] + list(self.capabilities.get(worker_id, []))
+
+
+class HeapSelectionPolicy(WorkerSelectionPolicy):
+    """
+    Picks the available worker with the smallest key(info).
+    
+    Keeps one min-heap per capability. Status changes cost O(c log n) for a
+    worker with c capabilities; stale entries are skipped lazily at
+    selection time and compacted when they outnumber live ones.
+    """
+    
+    def __init__(self, key=None):
+        super().__init__()
+        self.key = key or (lambda info: info["metrics"]["tasks_completed"])
+        self._heaps: Dict[Optional[str], List[tuple]] = {}
+        self._live: Dict[str, int] = {}
+        self._sequence = itertools.count()
+    
+    def mark_available(self, worker_id: str, info: Dict):
+        self.capabilities[worker_id] = list(info["capabilities"])
+        seq = next(self._sequence)
+        self._live[worker_id] = seq
+        entry = (self.key(info), seq, worker_id)
+        for capability in self._keys(worker_id):
+            heapq.heappush(self._heaps.setdefault(capability, []), entry)
+    
+    def mark_unavailable(self, worker_id: str):
+        self._live.pop(worker_id, None)
+    
+    def select(self, capability: Optional[str]) -> Optional[str]:
+        heap = self._heaps.get(capability)
+        if not heap:
+            return None
+        while heap and self._live.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        if len(heap) > 2 * len(self._live) + 64:
+            heap[:] = [entry for entry in heap if self._live.get(entry[2]) == entry[1]]
+            heapq.heapify(heap)
+        return heap[0][2] if heap else None
+
+
+class LeastLoadedPolicy(HeapSelectionPolicy):
+    """Worker with the fewest completed tasks."""
+
+
+class FastestResponsePolicy(HeapSelectionPolicy):
+    """Worker with the lowest average response time (least loaded on ties)."""
+    
+    def __init__(self):
+        super().__init__(lambda info: (info["metrics"]["avg_response_time"],
+                                       info["metrics"]["tasks_completed"]))
+
+
+class PowerOfTwoChoicesPolicy(WorkerSelectionPolicy):
+    """
+    Samples two available workers at random and takes the less loaded one.
+    
+    Available workers per capability are kept in an array with a position
+    index, so updates and selection are O(1) per capability.
+    """
+    
+    def __init__(self, seed: int = None):
+        super().__init__()
+        self.rng = random.Random(seed)
+        self._members: Dict[Optional[str], List[str]] = {}
+        self._positions: Dict[Optional[str], Dict[str, int]] = {}
+        self._load: Dict[str, int] = {}
+    
+    def mark_available(self, worker_id: str, info: Dict):
+        self.mark_unavailable(worker_id)
+        self.capabilities[worker_id] = list(info["capabilities"])
+        self._load[worker_id] = info["metrics"]["tasks_completed"]
+        for capability in self._keys(worker_id):
+            members = self._members.setdefault(capability, [])
+            self._positions.setdefault(capability, {})[worker_id] = len(members)
+            members.append(worker_id)
+    
+    def mark_unavailable(self, worker_id: str):
+        for capability in self._keys(worker_id):
+            positions = self._positions.get(capability, {})
+            index = positions.pop(worker_id, None)
+            if index is None:
+                continue
+            members = self._members[capability]
+            last = members.pop()
+            if last != worker_id:
+                members[index] = last
+                positions[last] = index
+    
+    def select(self, capability: Optional[str]) -> Optional[str]:
+        members = self._members.get(capability)
+        if not members:
+            return None
+        if len(members) == 1:
+            return members[0]
+        first, second = self.rng.sample(members, 2)
+        return first if self._load[first] <= self._load[second] else second
+
+
+SELECTION_POLICIES = {
+    "least_loaded": LeastLoadedPolicy,
+    "fastest": FastestResponsePolicy,
+    "power_of_two": PowerOfTwoChoicesPolicy,
+}
 
 
 # Supervisor Pattern Implementation
@@ -73,9 +574,15 @@ class SupervisorAgent:
     Central supervisor agent that coordinates worker agents.
     """
     
-    def __init__(self, name: str, communication: AgentCommunication):
+    def __init__(self, name: str, communication: AgentCommunication,
+                 selection_policy="least_loaded"):
         self.name = name
         self.communication = communication
+        if isinstance(selection_policy, str):
+            if selection_policy not in SELECTION_POLICIES:
+                raise ValueError(f"Unknown selection policy: {selection_policy}")
+            selection_policy = SELECTION_POLICIES[selection_policy]()
+        self.selection_policy: WorkerSelectionPolicy = selection_policy
         self.workers: Dict[str, Dict] = {}
         self.task_queue: List[Dict] = []
         self.completed_tasks: List[Dict] = []
@@ -83,12 +590,24 @@ class SupervisorAgent:
     
     def register_worker(self, worker_id: str, capabilities: List[str]):
         """Register a worker agent with the supervisor."""
+        if worker_id in self.workers:
+            self.selection_policy.mark_unavailable(worker_id)
         self.workers[worker_id] = {
             "capabilities": capabilities,
             "status": "available",
             "current_task": None,
             "metrics": {"tasks_completed": 0, "avg_response_time": 0}
         }
+        self.selection_policy.mark_available(worker_id, self.workers[worker_id])
+    
+    def set_worker_status(self, worker_id: str, status: str):
+        """Change a worker's status, keeping the selection index in sync."""
+        worker = self.workers[worker_id]
+        worker["status"] = status
+        if status == "available":
+            self.selection_policy.mark_available(worker_id, worker)
+        else:
+            self.selection_policy.mark_unavailable(worker_id)
     
     def decompose_task(self, task: Dict) -> List[Dict]:
         """
@@ -119,21 +638,35 @@ class SupervisorAgent:
             ]
         
         # Add parent task info
-        for subtask in subtasks:
+        for index, subtask in enumerate(subtasks):
+            subtask["id"] = f"{task.get('id', 'task')}.{index}"
             subtask["parent_task"] = task.get("id")
             subtask["priority"] = task.get("priority", 0)
         
         return subtasks
     
+    def decompose_task_graph(self, task: Dict) -> "TaskGraph":
+        """
+        Decompose a task into a dependency graph.
+        
+        The built-in research and create pipelines are sequential, so each
+        subtask depends on the previous one.
+        """
+        return TaskGraph.chain(self.decompose_task(task))
+    
     def assign_task(self, subtask: Dict, worker_id: str):
         """Assign a subtask to a worker agent."""
+        self.send(self._task_message(subtask, worker_id))
+    
+    def _task_message(self, subtask: Dict, worker_id: str) -> AgentMessage:
+        """Mark worker busy with subtask and build its request message."""
         if worker_id not in self.workers:
             raise ValueError(f"Unknown worker: {worker_id}")
         
-        self.workers[worker_id]["status"] = "busy"
-        self.workers[worker_id]["current_task"] = subtask["id"]
+        self.set_worker_status(worker_id, "busy")
+        self.workers[worker_id]["current_task"] = subtask.get("id")
         
-        self.send(AgentMessage(
+        return AgentMessage(
             sender=self.name,
             receiver=worker_id,
             message_type=MessageType.REQUEST,
@@ -143,31 +676,36 @@ class SupervisorAgent:
             },
             requires_response=True,
             priority=subtask.get("priority", 0)
-        ))
+        )
+    
+    def complete_task(self, worker_id: str, response_time: float):
+        """Mark worker available again and update its response metrics."""
+        worker = self.workers[worker_id]
+        metrics = worker["metrics"]
+        completed = metrics["tasks_completed"] + 1
+        metrics["avg_response_time"] += (response_time - metrics["avg_response_time"]) / completed
+        metrics["tasks_completed"] = completed
+        worker["current_task"] = None
+        self.set_worker_status(worker_id, "available")
     
     def select_worker(self, subtask: Dict) -> str:
-        """Select the best worker for a subtask."""
-        required_capability = subtask.get("type", "general")
+        """
+        Select the best worker for a subtask.
         
-        # Find available workers with required capability
-        candidates = [
-            wid for wid, info in self.workers.items()
-            if info["status"] == "available"
-            and required_capability in info["capabilities"]
-        ]
+        Prefers available workers with the subtask's capability, falling
+        back to any available worker; the selection policy picks among them.
+        """
+        required_capability = subtask.get("type", "general")
         
-        if not candidates:
+        worker_id = self.selection_policy.select(required_capability)
+        if worker_id is None:
             # Fall back to any available worker
-            candidates = [
-                wid for wid, info in self.workers.items()
-                if info["status"] == "available"
-            ]
+            worker_id = self.selection_policy.select(None)
         
-        if not candidates:
+        if worker_id is None:
             raise ValueError("No available workers")
         
-        # Select based on metrics (fewest tasks completed = most available)
-        return min(candidates, key=lambda w: self.workers[w]["metrics"]["tasks_completed"])
+        return worker_id
     
     def aggregate_results(self, subtask_results: List[Dict]) -> Dict:
         """Aggregate results from subtasks."""
@@ -187,8 +725,13 @@ class SupervisorAgent:
         
         return aggregated
     
-    def run_workflow(self, task: Dict) -> Dict:
-        """Execute a complete workflow with supervision."""
+    def run_workflow(self, task: Dict, timeout: float = 5.0) -> Dict:
+        """
+        Execute a complete workflow with supervision.
+        
+        Each subtask waits up to timeout seconds for its worker's response;
+        timed-out subtasks are recorded as failed results.
+        """
         # Decompose task
         subtasks = self.decompose_task(task)
         
@@ -196,14 +739,74 @@ class SupervisorAgent:
         results = []
         for subtask in subtasks:
             worker = self.select_worker(subtask)
-            self.assign_task(subtask, worker)
+            request = self._task_message(subtask, worker)
+            started = time.perf_counter()
+            self.send(request)
             
             # Wait for result
-            messages = self.receive(self.name)
-            for msg in messages:
-                if msg.message_type == MessageType.RESPONSE:
-                    results.append(msg.content)
+            response = self.receive_response(request, timeout)
+            if response is not None:
+                results.append(response.content)
+            else:
+                results.append({"success": False, "error": "timeout", "task": subtask["id"]})
+            self.complete_task(worker, time.perf_counter() - started)
         
+        return self._workflow_result(task, results)
+    
+    async def run_workflow_async(self, task: Dict, bus: AsyncMessageBus,
+                                 timeout: float = 30.0,
+                                 max_concurrency: int = None) -> Dict:
+        """
+        Execute a workflow over an AsyncMessageBus.
+        
+        Up to max_concurrency subtasks (default: all of them) are in flight
+        at once, each on its own available worker; a subtask waits for a
+        worker to free up when none is available. Each request is awaited
+        until its worker replies (via bus.reply) or timeout seconds pass;
+        timed-out or refused subtasks are recorded as failed results.
+        Results are returned in subtask order.
+        """
+        subtasks = self.decompose_task(task)
+        limit = asyncio.Semaphore(max(1, max_concurrency or len(subtasks)))
+        worker_freed = asyncio.Condition()
+        in_flight = 0
+        
+        def try_select(subtask: Dict) -> Optional[str]:
+            try:
+                return self.select_worker(subtask)
+            except ValueError:
+                if not in_flight:
+                    raise
+                return None
+        
+        async def run_subtask(subtask: Dict) -> Dict:
+            nonlocal in_flight
+            async with limit:
+                async with worker_freed:
+                    worker = await worker_freed.wait_for(lambda: try_select(subtask))
+                    message = self._task_message(subtask, worker)
+                    in_flight += 1
+                
+                started = time.perf_counter()
+                try:
+                    result = (await bus.request(message, timeout)).content
+                except asyncio.TimeoutError:
+                    result = {"success": False, "error": "timeout", "task": subtask["id"]}
+                except Exception as e:
+                    # e.g. the worker's inbox refused the request
+                    result = {"success": False, "error": str(e), "task": subtask["id"]}
+                finally:
+                    # Release the worker even if the request was refused
+                    async with worker_freed:
+                        in_flight -= 1
+                        self.complete_task(worker, time.perf_counter() - started)
+                        worker_freed.notify_all()
+                return result
+        
+        results = await asyncio.gather(*(run_subtask(subtask) for subtask in subtasks))
+        return self._workflow_result(task, list(results))
+    
+    def _workflow_result(self, task: Dict, results: List[Dict]) -> Dict:
         # Aggregate results
         final_result = self.aggregate_results(results)
         
@@ -217,6 +820,501 @@ class SupervisorAgent:
     def send(self, message: AgentMessage):
         """Send message through communication channel."""
         self.communication.send(message)
+    
+    def receive(self, timeout: float = None) -> List[AgentMessage]:
+        """Receive messages addressed to the supervisor."""
+        return self.communication.receive(self.name, timeout=timeout)
+    
+    def receive_response(self, request: AgentMessage,
+                         timeout: float = None) -> Optional[AgentMessage]:
+        """
+        Wait for the response to request, leaving other messages queued.
+        
+        Responses without a correlation_id are accepted from the worker the
+        request was sent to.
+        """
+        def matches(message: AgentMessage) -> bool:
+            if message.message_type != MessageType.RESPONSE:
+                return False
+            if message.correlation_id is not None:
+                return message.correlation_id == request.message_id
+            return message.sender == request.receiver
+        
+        return self.communication.receive_matching(self.name, matches, timeout)
+
+
+# DAG Scheduling
+
+@dataclass
+class TaskNode:
+    """A subtask in a workflow graph."""
+    id: str
+    type: str
+    description: str = ""
+    depends_on: List[str] = field(default_factory=list)
+    estimated_duration: float = 1.0
+    priority: int = 0
+
+
+class TaskGraph:
+    """
+    Directed acyclic graph of subtasks.
+    
+    Edges run from a dependency to the tasks that need its result.
+    """
+    
+    def __init__(self, nodes: List[TaskNode] = None):
+        self.nodes: Dict[str, TaskNode] = {}
+        for node in nodes or []:
+            self.add(node)
+    
+    def add(self, node: TaskNode) -> TaskNode:
+        if node.id in self.nodes:
+            raise ValueError(f"Duplicate task: {node.id}")
+        self.nodes[node.id] = node
+        return node
+    
+    def successors(self) -> Dict[str, List[str]]:
+        """Map each task to the tasks that depend on it."""
+        result = {node_id: [] for node_id in self.nodes}
+        for node in self.nodes.values():
+            for dependency in node.depends_on:
+                if dependency not in self.nodes:
+                    raise ValueError(f"Task {node.id} depends on unknown task {dependency}")
+                result[dependency].append(node.id)
+        return result
+    
+    def topological_order(self) -> List[str]:
+        """Kahn's algorithm; raises ValueError if the graph has a cycle."""
+        successors = self.successors()
+        indegree = {node_id: len(node.depends_on) for node_id, node in self.nodes.items()}
+        order = [node_id for node_id, degree in indegree.items() if degree == 0]
+        for node_id in order:
+            for successor in successors[node_id]:
+                indegree[successor] -= 1
+                if indegree[successor] == 0:
+                    order.append(successor)
+        if len(order) != len(self.nodes):
+            raise ValueError("Task graph contains a cycle")
+        return order
+    
+    def critical_path_lengths(self) -> Dict[str, float]:
+        """Longest estimated duration from each task to the end of the workflow."""
+        successors = self.successors()
+        lengths: Dict[str, float] = {}
+        for node_id in reversed(self.topological_order()):
+            tail = max((lengths[s] for s in successors[node_id]), default=0.0)
+            lengths[node_id] = self.nodes[node_id].estimated_duration + tail
+        return lengths
+    
+    @classmethod
+    def chain(cls, subtasks: List[Dict]) -> "TaskGraph":
+        """Build a graph where each subtask depends on the one before it."""
+        graph = cls()
+        previous = None
+        for subtask in subtasks:
+            graph.add(TaskNode(
+                id=subtask["id"],
+                type=subtask.get("type", "general"),
+                description=subtask.get("description", ""),
+                depends_on=[previous] if previous else [],
+                priority=subtask.get("priority", 0)
+            ))
+            previous = subtask["id"]
+        return graph
+
+
+class DAGScheduler:
+    """
+    Runs a TaskGraph through a SupervisorAgent over an AsyncMessageBus.
+    
+    A task becomes ready when all its dependencies have succeeded; ready
+    tasks are dispatched longest-critical-path first to available workers,
+    with at most max_concurrency in flight. Each request carries the
+    results of its dependencies under "inputs". Tasks whose dependencies
+    failed are skipped and reported as failed.
+    """
+    
+    def __init__(self, supervisor: SupervisorAgent, bus: AsyncMessageBus,
+                 timeout: float = 30.0, max_concurrency: int = None):
+        self.supervisor = supervisor
+        self.bus = bus
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+    
+    async def run(self, graph: TaskGraph, task: Dict = None) -> Dict:
+        """
+        Execute the graph and return the workflow result plus scheduling
+        statistics: makespan, critical path estimate, per-task timings and
+        per-worker utilization (busy time / makespan).
+        """
+        task = task or {}
+        successors = graph.successors()
+        critical = graph.critical_path_lengths()
+        waiting = {node_id: len(node.depends_on) for node_id, node in graph.nodes.items()}
+        limit = self.max_concurrency or len(graph.nodes) or 1
+        
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        order = itertools.count()
+        ready: List[tuple] = []
+        results: Dict[str, Dict] = {}
+        timings: Dict[str, Dict] = {}
+        busy_time: Dict[str, float] = {worker_id: 0.0 for worker_id in self.supervisor.workers}
+        running: Dict[asyncio.Task, tuple] = {}
+        
+        def push(node_id: str):
+            heapq.heappush(ready, (-critical[node_id], next(order), node_id))
+        
+        def skip(node_id: str):
+            results[node_id] = {"success": False, "error": "dependency_failed", "task": node_id}
+            for successor in successors[node_id]:
+                if successor not in results:
+                    skip(successor)
+        
+        for node_id, count in waiting.items():
+            if count == 0:
+                push(node_id)
+        
+        while ready or running:
+            while ready and len(running) < limit:
+                node = graph.nodes[ready[0][2]]
+                subtask = self._subtask(node, task, results)
+                try:
+                    worker = self.supervisor.select_worker(subtask)
+                except ValueError:
+                    if not running:
+                        raise
+                    break
+                heapq.heappop(ready)
+                message = self.supervisor._task_message(subtask, worker)
+                request = asyncio.ensure_future(self.bus.request(message, self.timeout))
+                running[request] = (node.id, worker, loop.time())
+            
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for request in done:
+                node_id, worker, dispatched = running.pop(request)
+                finished = loop.time()
+                try:
+                    result = request.result().content
+                except asyncio.TimeoutError:
+                    result = {"success": False, "error": "timeout", "task": node_id}
+                except Exception as e:
+                    # e.g. the worker's inbox refused the request
+                    result = {"success": False, "error": str(e), "task": node_id}
+                self.supervisor.complete_task(worker, finished - dispatched)
+                busy_time[worker] = busy_time.get(worker, 0.0) + finished - dispatched
+                results[node_id] = result
+                timings[node_id] = {
+                    "worker": worker,
+                    "start": dispatched - started,
+                    "end": finished - started
+                }
+                
+                for successor in successors[node_id]:
+                    if not result.get("success", False):
+                        if successor not in results:
+                            skip(successor)
+                        continue
+                    waiting[successor] -= 1
+                    if waiting[successor] == 0 and successor not in results:
+                        push(successor)
+        
+        makespan = loop.time() - started
+        workflow = self.supervisor._workflow_result(
+            task, [results[node_id] for node_id in graph.topological_order()]
+        )
+        workflow.update({
+            "task_results": results,
+            "timings": timings,
+            "makespan": makespan,
+            "critical_path_estimate": max(critical.values(), default=0.0),
+            "worker_utilization": {
+                worker_id: busy / makespan if makespan > 0 else 0.0
+                for worker_id, busy in busy_time.items()
+            }
+        })
+        return workflow
+    
+    @staticmethod
+    def _subtask(node: TaskNode, task: Dict, results: Dict[str, Dict]) -> Dict:
+        return {
+            "id": node.id,
+            "type": node.type,
+            "description": node.description,
+            "parent_task": task.get("id"),
+            "priority": node.priority,
+            "inputs": {dependency: results[dependency] for dependency in node.depends_on}
+        }
+
+
+# Work Stealing
+
+class WorkStealingScheduler:
+    """
+    Per-worker task deques with work stealing over an AsyncMessageBus.
+    
+    Subtasks are queued on a worker's deque by submit(). Each worker runs
+    its own queue from the head; when it is empty, it steals from the tail
+    of the longest queue, taking the last subtask whose type is among its
+    capabilities. A worker stuck on a slow subtask therefore no longer
+    holds up the work queued behind it.
+    """
+    
+    def __init__(self, supervisor: SupervisorAgent, bus: AsyncMessageBus,
+                 timeout: float = 30.0, steal: bool = True):
+        self.supervisor = supervisor
+        self.bus = bus
+        self.timeout = timeout
+        self.steal = steal
+        self.queues: Dict[str, deque] = {worker_id: deque() for worker_id in supervisor.workers}
+        self.stats = {"submitted": 0, "stolen": 0}
+    
+    def submit(self, subtask: Dict, worker_id: str = None) -> str:
+        """
+        Queue subtask on worker_id, or on the capable worker with the
+        shortest queue. Returns the chosen worker.
+        """
+        if worker_id is None:
+            capability = subtask.get("type", "general")
+            candidates = [w for w in self.queues if self._can_run(w, subtask)] or list(self.queues)
+            if not candidates:
+                raise ValueError(f"No worker for capability: {capability}")
+            worker_id = min(candidates, key=lambda w: len(self.queues[w]))
+        elif worker_id not in self.queues:
+            raise ValueError(f"Unknown worker: {worker_id}")
+        self.queues[worker_id].append(subtask)
+        self.stats["submitted"] += 1
+        return worker_id
+    
+    async def run(self) -> Dict:
+        """
+        Drain all queues and return results with completion statistics:
+        makespan, p50/p99 completion time, tasks run and stolen per worker.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results: Dict[str, Dict] = {}
+        completion: List[float] = []
+        executed = {worker_id: 0 for worker_id in self.queues}
+        stolen = {worker_id: 0 for worker_id in self.queues}
+        
+        async def worker_loop(worker_id: str):
+            while True:
+                subtask = self._take(worker_id)
+                if subtask is None:
+                    subtask = self._steal(worker_id)
+                    if subtask is None:
+                        return
+                    stolen[worker_id] += 1
+                
+                message = self.supervisor._task_message(subtask, worker_id)
+                dispatched = loop.time()
+                try:
+                    result = (await self.bus.request(message, self.timeout)).content
+                except asyncio.TimeoutError:
+                    result = {"success": False, "error": "timeout", "task": subtask.get("id")}
+                except Exception as e:
+                    result = {"success": False, "error": str(e), "task": subtask.get("id")}
+                finished = loop.time()
+                self.supervisor.complete_task(worker_id, finished - dispatched)
+                results[subtask.get("id")] = result
+                completion.append(finished - started)
+                executed[worker_id] += 1
+        
+        await asyncio.gather(*(worker_loop(worker_id) for worker_id in self.queues))
+        
+        self.stats["stolen"] += sum(stolen.values())
+        completion.sort()
+        return {
+            "results": results,
+            "makespan": loop.time() - started,
+            "p50_completion": self._percentile(completion, 0.50),
+            "p99_completion": self._percentile(completion, 0.99),
+            "executed": executed,
+            "stolen": stolen
+        }
+    
+    def _can_run(self, worker_id: str, subtask: Dict) -> bool:
+        return subtask.get("type", "general") in self.supervisor.workers[worker_id]["capabilities"]
+    
+    def _take(self, worker_id: str) -> Optional[Dict]:
+        own = self.queues[worker_id]
+        return own.popleft() if own else None
+    
+    def _steal(self, worker_id: str) -> Optional[Dict]:
+        if not self.steal:
+            return None
+        victims = sorted(
+            (w for w, tasks in self.queues.items() if tasks and w != worker_id),
+            key=lambda w: len(self.queues[w]), reverse=True
+        )
+        for victim in victims:
+            tasks = self.queues[victim]
+            for index in range(len(tasks) - 1, -1, -1):
+                if self._can_run(worker_id, tasks[index]):
+                    subtask = tasks[index]
+                    del tasks[index]
+                    return subtask
+        return None
+    
+    @staticmethod
+    def _percentile(sorted_values: List[float], fraction: float) -> float:
+        if not sorted_values:
+            return 0.0
+        return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+# Process Worker Backend
+
+def _pack_message(message: AgentMessage, shm_threshold: int) -> tuple:
+    """Pickle a message, moving payloads above shm_threshold bytes to shared memory."""
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) <= shm_threshold:
+        return ("inline", data)
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    block.buf[:len(data)] = data
+    block.close()
+    # Ownership passes to the receiver, which unlinks the block after reading
+    resource_tracker.unregister(block._name, "shared_memory")
+    return ("shm", block.name, len(data))
+
+
+def _unpack_message(packed: tuple) -> AgentMessage:
+    if packed[0] == "inline":
+        return pickle.loads(packed[1])
+    _, name, size = packed
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return pickle.loads(bytes(block.buf[:size]))
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _process_worker_main(worker_id: str, handler: Callable[[Dict], Dict],
+                         requests, responses, shm_threshold: int):
+    """Worker process loop: run handler on each request and send back a reply."""
+    while True:
+        packed = requests.get()
+        if packed is None:
+            return
+        message = _unpack_message(packed)
+        try:
+            content = handler(message.content)
+        except Exception as e:
+            content = {"success": False, "error": repr(e)}
+        reply = AgentMessage(
+            sender=worker_id,
+            receiver=message.sender,
+            message_type=MessageType.RESPONSE,
+            content=content,
+            correlation_id=message.message_id,
+            priority=message.priority
+        )
+        responses.put(_pack_message(reply, shm_threshold))
+
+
+class ProcessWorkerPool:
+    """
+    Runs supervisor workers in separate processes.
+    
+    Each started worker gets its own process executing handler(content) for
+    every message addressed to it, and a forwarding thread that moves
+    messages from the worker's inbox to the process over a multiprocessing
+    queue. Replies, correlated with their requests, come back on a shared
+    queue and are delivered through the bus (resolving pending requests)
+    or the communication channel. Pickled messages larger than
+    shm_threshold bytes travel through multiprocessing.shared_memory.
+    
+    SupervisorAgent is used unchanged: register_worker() then start_worker()
+    (or register_worker() here to do both), and assign_task() / the async
+    workflows route work to the processes. handler must be picklable
+    (a module-level function) when the spawn start method is used.
+    """
+    
+    def __init__(self, handler: Callable[[Dict], Dict],
+                 communication: AgentCommunication = None, bus: AsyncMessageBus = None,
+                 shm_threshold: int = 64 * 1024, start_method: str = None,
+                 poll_interval: float = 0.2):
+        if bus is None and communication is None:
+            raise ValueError("ProcessWorkerPool needs a communication channel or bus")
+        self.handler = handler
+        self.bus = bus
+        self.communication = communication or bus.communication
+        self.shm_threshold = shm_threshold
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context(start_method)
+        self._responses = self._context.Queue()
+        self._workers: Dict[str, tuple] = {}
+        self._running = threading.Event()
+        self._running.set()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+    
+    def register_worker(self, supervisor: SupervisorAgent, worker_id: str,
+                        capabilities: List[str]):
+        """Register worker_id with supervisor and start its process."""
+        supervisor.register_worker(worker_id, capabilities)
+        self.start_worker(worker_id)
+    
+    def start_worker(self, worker_id: str):
+        """Start the process and forwarding thread for worker_id."""
+        if worker_id in self._workers:
+            return
+        requests = self._context.Queue()
+        process = self._context.Process(
+            target=_process_worker_main,
+            args=(worker_id, self.handler, requests, self._responses, self.shm_threshold),
+            daemon=True
+        )
+        process.start()
+        forwarder = threading.Thread(
+            target=self._forward, args=(worker_id, requests), daemon=True
+        )
+        forwarder.start()
+        self._workers[worker_id] = (process, requests, forwarder)
+    
+    def close(self, timeout: float = 5.0):
+        """Stop all worker processes and background threads."""
+        self._running.clear()
+        for process, requests, forwarder in self._workers.values():
+            forwarder.join(timeout)
+            requests.put(None)
+        for process, _, _ in self._workers.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._responses.put(None)
+        self._collector.join(timeout)
+        self._workers.clear()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def _forward(self, worker_id: str, requests):
+        while self._running.is_set():
+            for message in self.communication.receive(worker_id, timeout=self.poll_interval):
+                requests.put(_pack_message(message, self.shm_threshold))
+    
+    def _collect(self):
+        while True:
+            try:
+                packed = self._responses.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if not self._running.is_set():
+                    return
+                continue
+            if packed is None:
+                return
+            reply = _unpack_message(packed)
+            if self.bus is not None:
+                self.bus.send(reply)
+            else:
+                self.communication.send(reply)
 
 
 # Handoff Protocol
@@ -244,6 +1342,17 @@ class HandoffProtocol:
             priority=1
         )
     
+    def acknowledge_handoff(self, handoff: AgentMessage) -> AgentMessage:
+        """Create the acknowledgment a receiving agent sends for a handoff."""
+        return AgentMessage(
+            sender=handoff.receiver,
+            receiver=handoff.sender,
+            message_type=MessageType.RESPONSE,
+            content={"status": "handoff_received"},
+            correlation_id=handoff.message_id,
+            priority=handoff.priority
+        )
+    
     def accept_handoff(self, agent_id: str) -> Optional[AgentMessage]:
         """Accept pending handoff for an agent."""
         messages = self.communication.receive(agent_id)
@@ -255,13 +1364,44 @@ class HandoffProtocol:
         return None
     
     def transfer_with_state(self, from_agent: str, to_agent: str,
-                           state: Dict, task: Dict) -> bool:
+                           state: Dict, task: Dict, timeout: float = 5.0) -> bool:
         """
         Transfer task state from one agent to another.
         
+        Blocks up to timeout seconds for the acknowledgment.
         Returns success status.
         """
-        handoff = self.create_handoff(
+        handoff = self._state_handoff(from_agent, to_agent, state, task)
+        self.communication.send(handoff)
+        
+        # Wait for acknowledgment, leaving other messages for from_agent queued
+        ack = self.communication.receive_matching(
+            from_agent, lambda m: self._is_ack(m, handoff), timeout
+        )
+        return ack is not None
+    
+    async def transfer_with_state_async(self, bus: AsyncMessageBus, from_agent: str,
+                                        to_agent: str, state: Dict, task: Dict,
+                                        timeout: float = 5.0) -> bool:
+        """Transfer task state over an AsyncMessageBus, awaiting the acknowledgment."""
+        handoff = self._state_handoff(from_agent, to_agent, state, task)
+        try:
+            ack = await bus.request(handoff, timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self._is_ack(ack, handoff)
+    
+    @staticmethod
+    def _is_ack(message: AgentMessage, handoff: AgentMessage) -> bool:
+        return (
+            message.message_type == MessageType.RESPONSE and
+            message.content.get("status") == "handoff_received" and
+            message.correlation_id in (None, handoff.message_id)
+        )
+    
+    def _state_handoff(self, from_agent: str, to_agent: str,
+                       state: Dict, task: Dict) -> AgentMessage:
+        return self.create_handoff(
             from_agent=from_agent,
             to_agent=to_agent,
             context={
@@ -271,18 +1411,6 @@ class HandoffProtocol:
             },
             reason="task_transfer"
         )
-        
-        self.communication.send(handoff)
-        
-        # Wait for acknowledgment
-        time.sleep(0.1)  # In production, use async with timeout
-        ack = self.communication.receive(from_agent)
-        
-        return any(
-            m.message_type == MessageType.RESPONSE and 
-            m.content.get("status") == "handoff_received"
-            for m in ack
-        )
 
 
 # Consensus Mechanism
@@ -383,9 +1511,10 @@ class AgentFailureHandler:
     """
     
     def __init__(self, communication: AgentCommunication, 
-                 max_retries: int = 3):
+                 max_retries: int = 3, clock: Callable[[], float] = time.time):
         self.communication = communication
         self.max_retries = max_retries
+        self.clock = clock
         self.failure_counts: Dict[str, int] = {}
         self.circuit_breakers: Dict[str, float] = {}  # agent -> unlock time
     
@@ -417,7 +1546,7 @@ class AgentFailureHandler:
     
     def _activate_circuit_breaker(self, agent_id: str):
         """Temporarily disable an agent."""
-        self.circuit_breakers[agent_id] = time.time() + 60  # 1 minute cooldown
+        self.circuit_breakers[agent_id] = self.clock() + 60  # 1 minute cooldown
     
     def _find_alternative_agent(self, failed_agent: str) -> str:
         """Find an alternative agent to handle the task."""
@@ -427,7 +1556,7 @@ class AgentFailureHandler:
     def is_available(self, agent_id: str) -> bool:
         """Check if an agent is available (circuit breaker not active)."""
         if agent_id in self.circuit_breakers:
-            if time.time() < self.circuit_breakers[agent_id]:
+            if self.clock() < self.circuit_breakers[agent_id]:
                 return False
             # Reset after cooldown
             del self.circuit_breakers[agent_id]
@@ -437,3 +1566,213 @@ class AgentFailureHandler:
     def record_success(self, agent_id: str):
         """Record a successful task completion."""
         self.failure_counts[agent_id] = 0
+
+
+# Simulation
+
+def exponential_service_time(mean: float = 1.0) -> Callable[[random.Random, Dict], float]:
+    """Service-time sampler drawing from an exponential distribution."""
+    return lambda rng, subtask: rng.expovariate(1.0 / mean)
+
+
+class CoordinationSimulator:
+    """
+    Discrete-event simulation of a supervisor and its workers.
+    
+    Drives a real SupervisorAgent (worker selection and metrics),
+    AgentFailureHandler (retries, backoff and circuit breakers) and
+    ConsensusManager on a virtual clock, so hours of coordination run in
+    seconds. Tasks arrive as a Poisson process at arrival_rate per second,
+    each needing one of capabilities; workers get capabilities_per_worker
+    of them. Service times come from service_time(rng, subtask), and each
+    execution fails with probability failure_rate; a task that fails
+    max_attempts times is given up on and counted as permanently failed.
+    A consensus_fraction of completed tasks go to a weighted vote among
+    consensus_voters agents.
+    """
+    
+    def __init__(self, n_workers: int = 100, policy="least_loaded",
+                 arrival_rate: float = 80.0, n_tasks: int = 10000,
+                 service_time: Callable[[random.Random, Dict], float] = None,
+                 failure_rate: float = 0.02, capabilities: List[str] = None,
+                 capabilities_per_worker: int = 2, consensus_fraction: float = 0.1,
+                 consensus_voters: int = 3, max_retries: int = 3,
+                 max_attempts: int = 10, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.now = 0.0
+        self.arrival_rate = arrival_rate
+        self.n_tasks = n_tasks
+        self.service_time = service_time or exponential_service_time(1.0)
+        self.failure_rate = failure_rate
+        self.max_attempts = max_attempts
+        self.capabilities = capabilities or ["search", "analyze", "synthesize", "review"]
+        self.consensus_fraction = consensus_fraction
+        self.consensus_voters = consensus_voters
+        
+        self.policy_name = policy if isinstance(policy, str) else type(policy).__name__
+        if policy == "power_of_two":
+            policy = PowerOfTwoChoicesPolicy(seed)
+        communication = AgentCommunication()
+        self.supervisor = SupervisorAgent("supervisor", communication, policy)
+        self.failure_handler = AgentFailureHandler(
+            communication, max_retries, clock=lambda: self.now
+        )
+        self.consensus = ConsensusManager()
+        
+        self.worker_ids = [f"worker_{i}" for i in range(n_workers)]
+        per_worker = min(capabilities_per_worker, len(self.capabilities))
+        for worker_id in self.worker_ids:
+            self.supervisor.register_worker(
+                worker_id, self.rng.sample(self.capabilities, per_worker)
+            )
+        
+        self._events: List[tuple] = []
+        self._sequence = itertools.count()
+        self._pending: deque = deque()
+    
+    def run(self) -> Dict:
+        """Run until every task has completed or failed permanently; return the metrics."""
+        started = time.perf_counter()
+        waits: List[float] = []
+        completions: List[float] = []
+        counters = {"events": 0, "failures": 0, "retries": 0,
+                    "circuit_breaks": 0, "consensus_rounds": 0, "permanently_failed": 0}
+        consensus_strength = 0.0
+        arrived = 0
+        last_completion = 0.0
+        
+        self._schedule(self.rng.expovariate(self.arrival_rate), "arrival", None)
+        while self._events:
+            self.now, _, kind, payload = heapq.heappop(self._events)
+            counters["events"] += 1
+            
+            if kind == "arrival":
+                self._pending.append({
+                    "id": f"task_{arrived}",
+                    "type": self.rng.choice(self.capabilities),
+                    "arrived": self.now,
+                    "enqueued": self.now,
+                    "attempts": 0
+                })
+                arrived += 1
+                if arrived < self.n_tasks:
+                    self._schedule(self.rng.expovariate(self.arrival_rate), "arrival", None)
+            
+            elif kind == "done":
+                worker_id, subtask, service = payload
+                if self.rng.random() < self.failure_rate:
+                    counters["failures"] += 1
+                    subtask["attempts"] += 1
+                    # The worker's failure still counts towards its circuit
+                    # breaker even when the task itself is given up on
+                    exhausted = subtask["attempts"] >= self.max_attempts
+                    if exhausted:
+                        counters["permanently_failed"] += 1
+                    action = self.failure_handler.handle_failure(worker_id, subtask["id"], "simulated")
+                    if action["action"] == "retry":
+                        if not exhausted:
+                            counters["retries"] += 1
+                            self._schedule(action["delay"], "retry", subtask)
+                        self.supervisor.set_worker_status(worker_id, "available")
+                    else:
+                        counters["circuit_breaks"] += 1
+                        if not exhausted:
+                            subtask["enqueued"] = self.now
+                            self._pending.appendleft(subtask)
+                        self.supervisor.set_worker_status(worker_id, "circuit_open")
+                        unlock = self.failure_handler.circuit_breakers[worker_id]
+                        self._schedule(unlock - self.now, "recover", worker_id)
+                else:
+                    self.failure_handler.record_success(worker_id)
+                    self.supervisor.complete_task(worker_id, service)
+                    completions.append(self.now - subtask["arrived"])
+                    last_completion = self.now
+                    if self.rng.random() < self.consensus_fraction:
+                        counters["consensus_rounds"] += 1
+                        consensus_strength += self._run_consensus(subtask)
+            
+            elif kind == "retry":
+                payload["enqueued"] = self.now
+                self._pending.appendleft(payload)
+            
+            elif kind == "recover":
+                if self.failure_handler.is_available(payload):
+                    self.supervisor.set_worker_status(payload, "available")
+            
+            waits.extend(self._dispatch())
+        
+        wall = time.perf_counter() - started
+        waits.sort()
+        completions.sort()
+        return {
+            "policy": self.policy_name,
+            "workers": len(self.worker_ids),
+            "tasks": len(completions),
+            "simulated_seconds": last_completion,
+            "throughput": len(completions) / last_completion if last_completion > 0 else 0.0,
+            "mean_queue_wait": sum(waits) / len(waits) if waits else 0.0,
+            "p99_queue_wait": WorkStealingScheduler._percentile(waits, 0.99),
+            "p50_completion": WorkStealingScheduler._percentile(completions, 0.50),
+            "p99_completion": WorkStealingScheduler._percentile(completions, 0.99),
+            "failures": counters["failures"],
+            "retries": counters["retries"],
+            "circuit_breaks": counters["circuit_breaks"],
+            "permanently_failed": counters["permanently_failed"],
+            "consensus_rounds": counters["consensus_rounds"],
+            "mean_consensus_strength": (consensus_strength / counters["consensus_rounds"]
+                                        if counters["consensus_rounds"] else 0.0),
+            "wall_seconds": wall,
+            "events_per_second": counters["events"] / wall if wall > 0 else 0.0
+        }
+    
+    def _schedule(self, delay: float, kind: str, payload):
+        heapq.heappush(self._events, (self.now + delay, next(self._sequence), kind, payload))
+    
+    def _dispatch(self) -> List[float]:
+        """Start pending tasks on available workers; returns their queue waits."""
+        waits = []
+        while self._pending:
+            subtask = self._pending[0]
+            try:
+                worker_id = self.supervisor.select_worker(subtask)
+            except ValueError:
+                break
+            self._pending.popleft()
+            self.supervisor.set_worker_status(worker_id, "busy")
+            self.supervisor.workers[worker_id]["current_task"] = subtask["id"]
+            service = self.service_time(self.rng, subtask)
+            self._schedule(service, "done", (worker_id, subtask, service))
+            # Time spent in the queue for this attempt; retry backoff and
+            # earlier service time are part of completion time instead
+            waits.append(self.now - subtask["enqueued"])
+        return waits
+    
+    def _run_consensus(self, subtask: Dict) -> float:
+        topic = subtask["id"]
+        voters = self.rng.sample(self.worker_ids, min(self.consensus_voters, len(self.worker_ids)))
+        options = ["accept", "revise"]
+        self.consensus.initiate_vote(topic, voters, options)
+        for voter in voters:
+            self.consensus.submit_vote(
+                topic, voter, self.rng.choice(options), self.rng.uniform(0.5, 1.0)
+            )
+        outcome = self.consensus.calculate_weighted_consensus(topic)
+        del self.consensus.votes[topic]
+        return outcome.get("consensus_strength", 0.0)
+
+
+def compare_policies(policies: List[str] = None, **params) -> List[Dict]:
+    """Run the same simulated workload under each selection policy."""
+    return [
+        CoordinationSimulator(policy=policy, **params).run()
+        for policy in policies or list(SELECTION_POLICIES)
+    ]
+
+
+if __name__ == "__main__":
+    for row in compare_policies(n_workers=1000, arrival_rate=800.0, n_tasks=50000):
+        print(f"{row['policy']:>13}: {row['throughput']:.0f} tasks/s, "
+              f"wait p99 {row['p99_queue_wait']:.2f}s, "
+              f"completion p99 {row['p99_completion']:.2f}s, "
+              f"{row['circuit_breaks']} circuit breaks "
+              f"({row['events_per_second']:.0f} events/s)")
@@ -14,42 +14,66 @@ PRODUCTION NOTES:
 """
 
 import numpy as np
-from typing import List, Dict
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Tuple
+import argparse
+import csv
+import json
+import mmap
+import os
 import re
+import sys
+import time
 
 
-def measure_attention_distribution(context_tokens: List[str], query: str) -> List[Dict]:
+class AttentionDistribution:
     """
-    Measure how attention varies across context positions.
+    Simulated attention over context positions, stored as NumPy arrays.
     
-    Returns distribution showing attention weight by position.
+    Indexing (dist[pos]) returns the per-position dict that
+    measure_attention_distribution historically produced, built on demand,
+    so existing callers keep working without materializing n dicts.
     """
-    n = len(context_tokens)
-    attention_by_position = []
     
-    for position in range(n):
-        is_beginning = position < n * 0.1
-        is_end = position > n * 0.9
-        
-        # Simulated attention measurement
-        # In production, this would use actual model attention weights
-        attention = _estimate_attention(position, n, is_beginning, is_end)
-        
-        attention_by_position.append({
+    def __init__(self, attention: np.ndarray, favored: np.ndarray,
+                 context_tokens: List[str] = None):
+        self.attention = attention
+        self.favored = favored
+        self.positions = np.arange(len(attention))
+        self.context_tokens = context_tokens
+    
+    def __len__(self) -> int:
+        return len(self.attention)
+    
+    def __getitem__(self, position: int) -> Dict:
+        n = len(self.attention)
+        position = int(self.positions[position])
+        tokens = None
+        if self.context_tokens is not None and (position < 5 or position > n - 5):
+            tokens = self.context_tokens[position][:50]
+        return {
             "position": position,
-            "attention": attention,
-            "region": "attention_favored" if (is_beginning or is_end) else "attention_degraded",
-            "tokens": context_tokens[position][:50] if position < 5 or position > n - 5 else None
-        })
+            "attention": float(self.attention[position]),
+            "region": "attention_favored" if self.favored[position] else "attention_degraded",
+            "tokens": tokens
+        }
+    
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
     
-    return attention_by_position
+    def regions(self) -> np.ndarray:
+        """Region label for every position."""
+        return np.where(self.favored, "attention_favored", "attention_degraded")
 
 
-def _estimate_attention(position: int, total: int, is_beginning: bool, is_end: bool) -> float:
+def compute_attention(n: int, rng: np.random.Generator = None):
     """
-    Estimate attention weight for position.
+    Vectorized U-shaped attention simulation for n positions.
     
-    Simulates U-shaped attention curve based on research findings.
+    Returns (attention, favored) arrays, where favored marks the first and
+    last 10% of positions.
     
     IMPORTANT: This is a simulation for demonstration purposes.
     Production systems should:
@@ -62,44 +86,79 @@ def _estimate_attention(position: int, total: int, is_beginning: bool, is_end: b
     - End tokens receive high attention (recency effect)
     - Middle tokens receive degraded attention (lost-in-middle)
     """
-    if is_beginning:
-        return 0.8 + np.random.random() * 0.2
-    elif is_end:
-        return 0.7 + np.random.random() * 0.3
-    else:
-        # Middle positions get reduced attention
-        middle_progress = (position - total * 0.1) / (total * 0.8)
-        base_attention = 0.3 * (1 - middle_progress) + 0.1 * middle_progress
-        return base_attention + np.random.random() * 0.1
+    rng = rng if rng is not None else np.random.default_rng()
+    positions = np.arange(n, dtype=np.float64)
+    noise = rng.random(n)
+    is_beginning = positions < n * 0.1
+    is_end = positions > n * 0.9
+    
+    middle_progress = (positions - n * 0.1) / (n * 0.8) if n else positions
+    middle = 0.3 * (1 - middle_progress) + 0.1 * middle_progress + noise * 0.1
+    attention = np.where(
+        is_beginning, 0.8 + noise * 0.2,
+        np.where(is_end, 0.7 + noise * 0.3, middle)
+    )
+    return attention, is_beginning | is_end
+
+
+def measure_attention_distribution(context_tokens: List[str], query: str,
+                                   seed: int = None) -> AttentionDistribution:
+    """
+    Measure how attention varies across context positions.
+    
+    Returns distribution showing attention weight by position. All
+    positions are computed in one vectorized pass with a seeded
+    Generator, so full contexts of ~10^6 tokens are cheap to analyze.
+    """
+    attention, favored = compute_attention(
+        len(context_tokens), np.random.default_rng(seed)
+    )
+    return AttentionDistribution(attention, favored, context_tokens)
 
 
 # Lost-in-Middle Detection
 
 def detect_lost_in_middle(critical_positions: List[int], 
-                          attention_distribution: List[Dict]) -> Dict:
+                          attention_distribution) -> Dict:
     """
     Check if critical information is in attention-degraded positions.
     
+    attention_distribution may be an AttentionDistribution (positions are
+    looked up by array indexing) or a list of per-position dicts.
+    
     Returns detection results and recommendations.
     """
+    at_risk = []
+    safe = []
+    
+    if isinstance(attention_distribution, AttentionDistribution):
+        positions = np.asarray(critical_positions, dtype=np.int64)
+        positions = positions[positions < len(attention_distribution)]
+        degraded = ~attention_distribution.favored[positions]
+        at_risk = positions[degraded].tolist()
+        safe = positions[~degraded].tolist()
+    else:
+        for pos in critical_positions:
+            if pos < len(attention_distribution):
+                region = attention_distribution[pos]["region"]
+                if region == "attention_degraded":
+                    at_risk.append(pos)
+                else:
+                    safe.append(pos)
+    
+    return _lost_in_middle_result(at_risk, safe, len(critical_positions))
+
+
+def _lost_in_middle_result(at_risk: List[int], safe: List[int],
+                           total_critical: int) -> Dict:
+    """Score at-risk positions and attach recommendations."""
     results = {
-        "at_risk": [],
-        "safe": [],
+        "at_risk": at_risk,
+        "safe": safe,
         "recommendations": [],
         "degradation_score": 0.0
     }
-    
-    at_risk_count = 0
-    total_critical = len(critical_positions)
-    
-    for pos in critical_positions:
-        if pos < len(attention_distribution):
-            region = attention_distribution[pos]["region"]
-            if region == "attention_degraded":
-                results["at_risk"].append(pos)
-                at_risk_count += 1
-            else:
-                results["safe"].append(pos)
+    at_risk_count = len(at_risk)
     
     # Calculate degradation score
     if total_critical > 0:
@@ -117,6 +176,22 @@ def detect_lost_in_middle(critical_positions: List[int],
     return results
 
 
+def detect_lost_in_middle_for_length(critical_positions: List[int], n: int) -> Dict:
+    """
+    detect_lost_in_middle for a context of n tokens without building the
+    distribution; regions depend only on n, so this is O(len(critical_positions)).
+    """
+    positions = np.asarray(critical_positions, dtype=np.int64)
+    positions = positions[positions < n]
+    # Same region rule as compute_attention (negative positions index from the end)
+    absolute = np.where(positions < 0, positions + n, positions)
+    favored = (absolute < n * 0.1) | (absolute > n * 0.9)
+    return _lost_in_middle_result(
+        positions[~favored].tolist(), positions[favored].tolist(),
+        len(critical_positions)
+    )
+
+
 def analyze_context_structure(context: str) -> Dict:
     """
     Analyze context structure for degradation risk factors.
@@ -160,8 +235,194 @@ def analyze_context_structure(context: str) -> Dict:
     }
 
 
+def _count_newlines(buffer, start: int, end: int, chunk_size: int) -> int:
+    """Count b'\\n' in buffer[start:end], copying at most chunk_size bytes at a time."""
+    count = 0
+    for offset in range(start, end, chunk_size):
+        count += buffer[offset:min(end, offset + chunk_size)].count(b'\n')
+    return count
+
+
+def _iter_header_lines(buffer, size: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Yield (line_index, byte_offset) for every line starting with '#'."""
+    line, position = 0, 0
+    if size and buffer[0:1] == b'#':
+        yield 0, 0
+    while True:
+        found = buffer.find(b'\n#', position)
+        if found < 0:
+            return
+        line += _count_newlines(buffer, position, found, chunk_size) + 1
+        position = found + 1
+        yield line, position
+
+
+def analyze_context_structure_file(path: str, max_sections: int = 100,
+                                   chunk_size: int = 1 << 22) -> Dict:
+    """
+    Analyze the structure of a context dump on disk without loading it.
+    
+    The file is memory-mapped and scanned twice: once to count lines, and
+    once jumping between header lines to accumulate section statistics and
+    the middle-content ratio. Memory use is bounded by chunk_size and
+    max_sections regardless of file size. Results match
+    analyze_context_structure on the decoded text, except that "sections"
+    holds only the first max_sections entries; "section_count" and
+    "section_lengths" describe all of them.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            n = _count_newlines(buffer, 0, size, chunk_size) + 1
+            middle_start = int(n * 0.3)
+            middle_end = int(n * 0.7)
+            
+            sections = []
+            section_count = 0
+            middle_content = 0
+            shortest, longest = n, 0
+            
+            def close_section(start: int, length: int, offset: int):
+                nonlocal section_count, middle_content, shortest, longest
+                section_count += 1
+                shortest, longest = min(shortest, length), max(longest, length)
+                if middle_start <= start <= middle_end:
+                    middle_content += length
+                if len(sections) < max_sections:
+                    section = {"start": start, "type": "unknown", "length": length}
+                    if offset >= 0:
+                        line_end = buffer.find(b'\n', offset)
+                        line_text = buffer[offset:size if line_end < 0 else line_end]
+                        section["type"] = "header"
+                        section["header"] = line_text.decode('utf-8', 'replace').lstrip('#').strip()
+                    sections.append(section)
+            
+            current_start, current_offset = 0, -1
+            for line, offset in _iter_header_lines(buffer, size, chunk_size):
+                if line - current_start > 0:
+                    close_section(current_start, line - current_start, current_offset)
+                current_start, current_offset = line, offset
+            close_section(current_start, n - current_start, current_offset)
+        finally:
+            if size:
+                buffer.close()
+    
+    ratio = middle_content / n
+    return {
+        "total_lines": n,
+        "sections": sections,
+        "section_count": section_count,
+        "section_lengths": {
+            "min": shortest,
+            "max": longest,
+            "mean": n / section_count
+        },
+        "middle_content_ratio": ratio,
+        "degradation_risk": "high" if ratio > 0.5 else "medium" if ratio > 0.3 else "low"
+    }
+
+
 # Context Poisoning Detection
 
+_LITERAL_PATTERN = re.compile(r'(?:[^.^$*+?{}\[\]|()\\]|\\[^\w])*')
+
+
+class IndicatorScanner:
+    """
+    One-pass, case-insensitive scanner that tags sentences with indicators.
+    
+    Literal patterns are merged into a character trie and compiled, with
+    any non-literal regex patterns and the sentence delimiter ('.'), into a
+    single zero-width alternation over the lowercased text. One finditer
+    therefore both segments the text into sentences (as text.split('.')
+    would) and records which indicators occur in which sentence, with cost
+    linear in the text size however many patterns are configured.
+    
+    Literals that are prefixes of each other are all reported; a regex
+    pattern starting at the same offset as a literal match is not.
+    """
+    
+    def __init__(self, classes: Dict[str, List[str]]):
+        self.classes = classes
+        self._group_ids: Dict[str, List[tuple]] = {}
+        trie: Dict = {}
+        regexes = []
+        for cls, patterns in classes.items():
+            for idx, pattern in enumerate(patterns):
+                if _LITERAL_PATTERN.fullmatch(pattern):
+                    node = trie
+                    for ch in re.sub(r'\\(.)', r'\1', pattern).lower():
+                        node = node.setdefault(ch, {})
+                    node.setdefault(None, []).append((cls, idx))
+                else:
+                    regexes.append((pattern, (cls, idx)))
+        
+        node = trie.setdefault(".", {})
+        node.setdefault(None, []).append(("period", 0))
+        
+        alternatives = [self._compile_trie(trie, [])]
+        for pattern, indicator in regexes:
+            group = f"g{len(self._group_ids)}"
+            self._group_ids[group] = [indicator]
+            alternatives.append(f"(?P<{group}>(?i:{pattern}))")
+        self._master = re.compile("(?=" + "|".join(alternatives) + ")")
+        self._master_ignorecase = None
+    
+    def _compile_trie(self, node: Dict, inherited: List[tuple]) -> str:
+        """Compile a trie node; each end group also reports shorter literals."""
+        ends = inherited + node.get(None, [])
+        branches = [
+            re.escape(ch) + self._compile_trie(child, ends)
+            for ch, child in sorted((k, v) for k, v in node.items() if k is not None)
+        ]
+        children = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if None not in node:
+            return children
+        group = f"g{len(self._group_ids)}"
+        self._group_ids[group] = ends
+        if not branches:
+            return f"(?P<{group}>)"
+        return f"(?P<{group}>)(?:{children})?"
+    
+    def scan(self, text: str) -> Dict:
+        """
+        Scan text once.
+        
+        Returns "periods" (offsets of each '.'), "tags" (sentence index ->
+        set of (class, pattern_index)) for sentences with any indicator,
+        and "seen" (every (class, pattern_index) found anywhere).
+        """
+        lowered = text.lower()
+        master = self._master
+        if len(lowered) != len(text):
+            # Some characters change length when lowercased; match the
+            # original text case-insensitively so offsets stay valid
+            lowered = text
+            if self._master_ignorecase is None:
+                self._master_ignorecase = re.compile(self._master.pattern, re.IGNORECASE)
+            master = self._master_ignorecase
+        
+        periods = []
+        tags: Dict[int, set] = {}
+        seen = set()
+        for match in master.finditer(lowered):
+            for indicator in self._group_ids[match.lastgroup]:
+                if indicator[0] == "period":
+                    periods.append(match.start())
+                    continue
+                seen.add(indicator)
+                tags.setdefault(len(periods), set()).add(indicator)
+        return {"periods": periods, "tags": tags, "seen": seen}
+    
+    @staticmethod
+    def sentence(text: str, periods: List[int], index: int) -> str:
+        """Return sentence index as text.split('.') would, without splitting."""
+        start = periods[index - 1] + 1 if index > 0 else 0
+        end = periods[index] if index < len(periods) else len(text)
+        return text[start:end]
+
+
 class PoisoningDetector:
     def __init__(self):
         self.claims = []
@@ -174,10 +435,32 @@ class PoisoningDetector:
             r"invalid",
             r"not found"
         ]
+        self.conflict_patterns = [
+            (r"however", r"but"),
+            (r"on the other hand", r"instead"),
+            (r"although", r"yet"),
+            (r"despite", r"nevertheless")
+        ]
+        self.hallucination_markers = [
+            "may have been",
+            "might have",
+            "could potentially",
+            "possibly",
+            "apparently",
+            "reportedly",
+            "it is said that",
+            "sources suggest",
+            "believed to be",
+            "thought to be"
+        ]
+        self._scanner = None
+        self._scanner_key = None
+        self._last_scan = (None, None)
     
     def extract_claims(self, text: str) -> List[Dict]:
         """Extract claims from text for verification tracking."""
         # Simple claim extraction - in production use NER and fact extraction
+        scan = self._scan(text)
         sentences = text.split('.')
         claims = []
         
@@ -191,8 +474,7 @@ class PoisoningDetector:
                 "text": sentence,
                 "verified": None,
                 "has_error_indicator": any(
-                    re.search(pattern, sentence, re.IGNORECASE) 
-                    for pattern in self.error_patterns
+                    cls == "error" for cls, _ in scan["tags"].get(i, ())
                 )
             })
         
@@ -203,13 +485,20 @@ class PoisoningDetector:
         """
         Detect potential context poisoning indicators.
         """
+        scan = self._scan(context)
+        return self._poisoning_report(
+            scan["seen"],
+            self._detect_contradictions(context),
+            self._detect_hallucination_markers(context)
+        )
+    
+    def _poisoning_report(self, seen: set, contradictions: List[str],
+                          hallucination_markers: List[str]) -> Dict:
+        """Build the detect_poisoning result from scanned indicators."""
         indicators = []
         
         # Check for error accumulation
-        error_count = sum(
-            1 for pattern in self.error_patterns 
-            if re.search(pattern, context, re.IGNORECASE)
-        )
+        error_count = sum(1 for cls, _ in seen if cls == "error")
         
         if error_count > 3:
             indicators.append({
@@ -220,7 +509,6 @@ class PoisoningDetector:
             })
         
         # Check for contradiction patterns
-        contradictions = self._detect_contradictions(context)
         if contradictions:
             indicators.append({
                 "type": "contradictions",
@@ -231,7 +519,6 @@ class PoisoningDetector:
             })
         
         # Check for hallucination markers
-        hallucination_markers = self._detect_hallucination_markers(context)
         if hallucination_markers:
             indicators.append({
                 "type": "hallucination_markers",
@@ -249,56 +536,65 @@ class PoisoningDetector:
     def _detect_contradictions(self, text: str) -> List[str]:
         """Detect potential contradictions in text."""
         contradictions = []
+        scan = self._scan(text)
+        tagged_sentences = sorted(scan["tags"])
         
         # Look for conflict markers
-        conflict_patterns = [
-            (r"however", r"but"),
-            (r"on the other hand", r"instead"),
-            (r"although", r"yet"),
-            (r"despite", r"nevertheless")
-        ]
-        
-        for pattern1, pattern2 in conflict_patterns:
-            if re.search(pattern1, text, re.IGNORECASE) and re.search(pattern2, text, re.IGNORECASE):
-                # Find sentences containing these patterns
-                sentences = text.split('.')
-                for sentence in sentences:
-                    if re.search(pattern1, sentence, re.IGNORECASE) or \
-                       re.search(pattern2, sentence, re.IGNORECASE):
-                        if sentence.strip() and len(sentence.strip()) < 200:
-                            contradictions.append(sentence.strip()[:100])
+        for pair_index in range(len(self.conflict_patterns)):
+            first, second = ("conflict_a", pair_index), ("conflict_b", pair_index)
+            if first not in scan["seen"] or second not in scan["seen"]:
+                continue
+            
+            # Sentences containing either side of the pair
+            for index in tagged_sentences:
+                tags = scan["tags"][index]
+                if first in tags or second in tags:
+                    sentence = IndicatorScanner.sentence(text, scan["periods"], index).strip()
+                    if sentence and len(sentence) < 200:
+                        contradictions.append(sentence[:100])
+                        if len(contradictions) == 5:
+                            return contradictions
         
-        return contradictions[:5]
+        return contradictions
     
     def _detect_hallucination_markers(self, text: str) -> List[str]:
         """Detect phrases associated with uncertain or hallucinated claims."""
-        markers = [
-            "may have been",
-            "might have",
-            "could potentially",
-            "possibly",
-            "apparently",
-            "reportedly",
-            "it is said that",
-            "sources suggest",
-            "believed to be",
-            "thought to be"
+        seen = self._scan(text)["seen"]
+        return [
+            marker for i, marker in enumerate(self.hallucination_markers)
+            if ("hallucination", i) in seen
         ]
+    
+    def _scan(self, text: str) -> Dict:
+        """Scan text, reusing the result for repeated calls on the same string."""
+        key = (tuple(self.error_patterns), tuple(self.conflict_patterns),
+               tuple(self.hallucination_markers))
+        if key != self._scanner_key:
+            self._scanner = IndicatorScanner({
+                "error": list(self.error_patterns),
+                "conflict_a": [a for a, _ in self.conflict_patterns],
+                "conflict_b": [b for _, b in self.conflict_patterns],
+                "hallucination": [re.escape(m) for m in self.hallucination_markers]
+            })
+            self._scanner_key = key
+            self._last_scan = (None, None)
         
-        found = []
-        for marker in markers:
-            if marker in text.lower():
-                found.append(marker)
-        
-        return found
+        last_text, last_result = self._last_scan
+        if last_text is not text:
+            last_result = self._scanner.scan(text)
+            self._last_scan = (text, last_result)
+        return last_result
 
 
 # Context Health Score
 
 class ContextHealthAnalyzer:
-    def __init__(self, context_limit: int = 100000):
+    def __init__(self, context_limit: int = 100000, seed: int = None,
+                 history_size: int = 100):
         self.context_limit = context_limit
-        self.metrics_history = []
+        self.seed = seed
+        # Ring buffer: only the most recent history_size results are kept
+        self.metrics_history = deque(maxlen=history_size)
     
     def analyze(self, context: str, critical_positions: List[int] = None) -> Dict:
         """
@@ -308,12 +604,12 @@ class ContextHealthAnalyzer:
         
         # Basic metrics
         token_count = len(tokens)
-        utilization = token_count / self.context_limit
         
-        # Attention analysis
+        # Attention analysis over the full context (vectorized)
         attention_dist = measure_attention_distribution(
-            tokens[:1000],  # Sample for efficiency
-            "current_task"
+            tokens,
+            "current_task",
+            seed=self.seed
         )
         
         degradation = detect_lost_in_middle(
@@ -324,6 +620,13 @@ class ContextHealthAnalyzer:
         # Poisoning check
         poisoning = PoisoningDetector().detect_poisoning(context)
         
+        return self._build_result(token_count, degradation, poisoning)
+    
+    def _build_result(self, token_count: int, degradation: Dict,
+                      poisoning: Dict) -> Dict:
+        """Score the analysis, record it in history and return it."""
+        utilization = token_count / self.context_limit
+        
         # Calculate health score
         health_score = self._calculate_health_score(
             utilization=utilization,
@@ -399,16 +702,155 @@ class ContextHealthAnalyzer:
         return recommendations
 
 
+class IncrementalHealthAnalyzer(ContextHealthAnalyzer):
+    """
+    Health analysis for append-only contexts that only processes new text.
+    
+    Keeps a running token count, line/header statistics and poisoning
+    indicator tallies per completed sentence. Each append() scans only the
+    new suffix plus the still-open final sentence (capped at
+    max_open_sentence characters), so per-turn cost is proportional to the
+    appended text rather than the whole context. Results match
+    ContextHealthAnalyzer.analyze on the full text.
+    """
+    
+    def __init__(self, context_limit: int = 100000, history_size: int = 100,
+                 max_open_sentence: int = 65536):
+        super().__init__(context_limit, history_size=history_size)
+        self.detector = PoisoningDetector()
+        self.max_open_sentence = max_open_sentence
+        self.reset()
+    
+    def reset(self):
+        """Forget all processed text (history is kept)."""
+        self.length = 0
+        self.token_count = 0
+        self.line_count = 1
+        self.header_count = 0
+        self._ends_in_word = False
+        self._at_line_start = True
+        self._tail = ""
+        self.seen = set()
+        self._pair_sentences = [[] for _ in self.detector.conflict_patterns]
+        self._open_sentence = ""
+        self._open_tags = set()
+    
+    def append(self, suffix: str, critical_positions: List[int] = None) -> Dict:
+        """Process newly appended text and return the updated analysis."""
+        if suffix:
+            self._count_tokens(suffix)
+            self._count_structure(suffix)
+            self._scan(suffix)
+            self.length += len(suffix)
+            self._tail = (self._tail + suffix)[-64:]
+        return self._report(critical_positions)
+    
+    def update(self, context: str, critical_positions: List[int] = None) -> Dict:
+        """
+        Analyze the full current context, processing only the part appended
+        since the last call. Falls back to a full rescan if the context
+        does not extend the previously seen text.
+        """
+        boundary = context[max(0, self.length - len(self._tail)):self.length]
+        if len(context) < self.length or boundary != self._tail:
+            self.reset()
+        return self.append(context[self.length:], critical_positions)
+    
+    def get_structure_stats(self) -> Dict:
+        """Running line and section-header statistics."""
+        return {
+            "total_lines": self.line_count,
+            "headers": self.header_count,
+            "avg_section_lines": self.line_count / (self.header_count + 1)
+        }
+    
+    def _count_tokens(self, suffix: str):
+        count = len(suffix.split())
+        # A word split across the append boundary is one token
+        if self._ends_in_word and not suffix[0].isspace() and count:
+            count -= 1
+        self.token_count += count
+        self._ends_in_word = not suffix[-1].isspace()
+    
+    def _count_structure(self, suffix: str):
+        self.line_count += suffix.count('\n')
+        self.header_count += suffix.count('\n#')
+        if self._at_line_start and suffix[0] == '#':
+            self.header_count += 1
+        self._at_line_start = suffix[-1] == '\n'
+    
+    def _scan(self, suffix: str):
+        text = self._open_sentence + suffix
+        scan = self.detector._scan(text)
+        periods = scan["periods"]
+        
+        for index in range(len(periods)):
+            tags = scan["tags"].get(index)
+            if tags:
+                self._close_sentence(
+                    IndicatorScanner.sentence(text, periods, index), tags
+                )
+        
+        self._open_sentence = IndicatorScanner.sentence(text, periods, len(periods))
+        self._open_tags = scan["tags"].get(len(periods), set())
+        if len(self._open_sentence) > self.max_open_sentence:
+            # Very long run without a '.'; treat it as complete to bound rescans
+            self._close_sentence(self._open_sentence, self._open_tags)
+            self._open_sentence = ""
+            self._open_tags = set()
+    
+    def _close_sentence(self, sentence: str, tags: set):
+        self.seen |= tags
+        for pair_index, pair_sentences in enumerate(self._pair_sentences):
+            if len(pair_sentences) < 5 and self._has_conflict(tags, pair_index):
+                sentence_text = sentence.strip()
+                if sentence_text and len(sentence_text) < 200:
+                    pair_sentences.append(sentence_text[:100])
+    
+    @staticmethod
+    def _has_conflict(tags: set, pair_index: int) -> bool:
+        return ("conflict_a", pair_index) in tags or ("conflict_b", pair_index) in tags
+    
+    def _report(self, critical_positions: List[int] = None) -> Dict:
+        seen = self.seen | self._open_tags
+        open_text = self._open_sentence.strip()
+        
+        contradictions = []
+        for pair_index, pair_sentences in enumerate(self._pair_sentences):
+            if ("conflict_a", pair_index) not in seen or ("conflict_b", pair_index) not in seen:
+                continue
+            candidates = list(pair_sentences)
+            if (self._has_conflict(self._open_tags, pair_index)
+                    and open_text and len(open_text) < 200):
+                candidates.append(open_text[:100])
+            contradictions.extend(candidates[:5 - len(contradictions)])
+            if len(contradictions) == 5:
+                break
+        
+        markers = [
+            marker for i, marker in enumerate(self.detector.hallucination_markers)
+            if ("hallucination", i) in seen
+        ]
+        poisoning = self.detector._poisoning_report(seen, contradictions, markers)
+        degradation = detect_lost_in_middle_for_length(
+            critical_positions or list(range(10)), self.token_count
+        )
+        return self._build_result(self.token_count, degradation, poisoning)
+
+
 # Usage Example
 
-def analyze_agent_context(context: str) -> Dict:
+def analyze_agent_context(context: str, verbose: bool = True,
+                          context_limit: int = 80000) -> Dict:
     """Analyze context for an agent session."""
-    analyzer = ContextHealthAnalyzer(context_limit=80000)
+    analyzer = ContextHealthAnalyzer(context_limit=context_limit)
     
     # Define critical positions (e.g., goals, constraints)
     critical_positions = list(range(5))  # First 5 items are critical
     
     result = analyzer.analyze(context, critical_positions)
+    if not verbose:
+        return result
     
     print(f"Health Score: {result['health_score']:.2f}")
     print(f"Status: {result['status']}")
@@ -417,3 +859,159 @@ def analyze_agent_context(context: str) -> Dict:
         print(f"  - {rec}")
     
     return result
+
+
+# Batch Analysis
+
+SUMMARY_COLUMNS = [
+    "id", "token_count", "utilization", "health_score", "status",
+    "degradation_score", "poisoning_risk", "issue_count"
+]
+
+
+def _record_context(record) -> str:
+    """Extract the context text from a JSONL transcript record."""
+    if isinstance(record, str):
+        return record
+    if "context" in record:
+        return record["context"]
+    return "\n".join(str(m.get("content", "")) for m in record.get("messages", []))
+
+
+def iter_transcripts(source: str) -> Iterator[Tuple[str, str]]:
+    """
+    Lazily yield (id, context) pairs from a directory or JSONL file.
+    
+    Every regular file in a directory is one transcript, identified by its
+    name. Each JSONL line is a string or an object with a "context" string
+    or a "messages" list, identified by its "id" field or line number.
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path):
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    yield name, f.read()
+        return
+    
+    with open(source, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                record = json.loads(line)
+                record_id = record.get("id", line_number) if isinstance(record, dict) else line_number
+                yield str(record_id), _record_context(record)
+
+
+def _analyze_chunk(chunk: List[Tuple[str, str]], context_limit: int) -> Dict[str, list]:
+    """Analyze (id, context) pairs into summary columns; runs in a worker process."""
+    columns = {name: [] for name in SUMMARY_COLUMNS}
+    for context_id, context in chunk:
+        result = analyze_agent_context(context, verbose=False, context_limit=context_limit)
+        metrics = result["metrics"]
+        columns["id"].append(context_id)
+        columns["token_count"].append(metrics["token_count"])
+        columns["utilization"].append(metrics["utilization"])
+        columns["health_score"].append(result["health_score"])
+        columns["status"].append(result["status"])
+        columns["degradation_score"].append(metrics["degradation_score"])
+        columns["poisoning_risk"].append(metrics["poisoning_risk"])
+        issues = result["issues"]
+        columns["issue_count"].append(
+            len(issues["poisoning"]["indicators"])
+            + (1 if issues["lost_in_middle"]["at_risk"] else 0)
+        )
+    return columns
+
+
+def _chunked(items, chunk_size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def batch_analyze(source: str, output: str = None, max_workers: int = None,
+                  chunk_size: int = 64, context_limit: int = 80000) -> Dict:
+    """
+    Analyze every transcript in source on a process pool.
+    
+    Transcripts are read lazily and sent to up to max_workers processes
+    (default: all cores) in chunks of chunk_size, with at most two chunks
+    per worker in flight so memory stays bounded on large fleets. Per-context
+    results are collected as columns (SUMMARY_COLUMNS) and, when output is
+    given, written there as CSV in input order.
+    
+    Returns the columns plus aggregate statistics and throughput.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    columns = {name: [] for name in SUMMARY_COLUMNS}
+    chunks = _chunked(iter_transcripts(source), chunk_size)
+    started = time.perf_counter()
+    
+    def collect(chunk_columns: Dict[str, list]):
+        for name in SUMMARY_COLUMNS:
+            columns[name].extend(chunk_columns[name])
+    
+    if workers == 1:
+        for chunk in chunks:
+            collect(_analyze_chunk(chunk, context_limit))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            for chunk in chunks:
+                in_flight.append(executor.submit(_analyze_chunk, chunk, context_limit))
+                if len(in_flight) >= 2 * workers:
+                    collect(in_flight.popleft().result())
+            while in_flight:
+                collect(in_flight.popleft().result())
+    
+    elapsed = time.perf_counter() - started
+    count = len(columns["id"])
+    
+    if output:
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(SUMMARY_COLUMNS)
+            writer.writerows(zip(*(columns[name] for name in SUMMARY_COLUMNS)))
+    
+    health = np.asarray(columns["health_score"], dtype=float)
+    return {
+        "columns": columns,
+        "contexts": count,
+        "seconds": elapsed,
+        "contexts_per_second": count / elapsed if elapsed > 0 else 0.0,
+        "mean_health_score": float(health.mean()) if count else 0.0,
+        "p10_health_score": float(np.percentile(health, 10)) if count else 0.0,
+        "status_counts": dict(Counter(columns["status"])),
+        "poisoning_risk_counts": dict(Counter(columns["poisoning_risk"]))
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    """Command-line entry point for batch health analysis."""
+    parser = argparse.ArgumentParser(
+        description="Batch context health analysis over stored agent transcripts."
+    )
+    parser.add_argument("source", help="directory of transcripts or a JSONL file")
+    parser.add_argument("-o", "--output", help="write per-context summary CSV here")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--context-limit", type=int, default=80000)
+    args = parser.parse_args(argv)
+    
+    summary = batch_analyze(args.source, args.output, args.workers,
+                            args.chunk_size, args.context_limit)
+    print(f"Analyzed {summary['contexts']} contexts in {summary['seconds']:.2f}s "
+          f"({summary['contexts_per_second']:.0f} contexts/s)")
+    print(f"Mean health score: {summary['mean_health_score']:.2f} "
+          f"(p10 {summary['p10_health_score']:.2f})")
+    print(f"Status: {summary['status_counts']}")
+    print(f"Poisoning risk: {summary['poisoning_risk_counts']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
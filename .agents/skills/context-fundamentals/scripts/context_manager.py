@@ -8,8 +8,18 @@ Production systems should use actual tokenizers (tiktoken for OpenAI,
 model-specific tokenizers for other providers) for accurate token counts.
 """
 
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import asyncio
 import hashlib
+import mmap
+import os
+import re
+import threading
+import weakref
+import zlib
 
 
 def estimate_token_count(text: str) -> int:
@@ -74,27 +84,154 @@ def count_tokens_by_type(context: Dict) -> Dict:
     return breakdown
 
 
+# Section Interning
+
+@dataclass(frozen=True)
+class ContextSection:
+    """Immutable section content with its precomputed token count."""
+    content: str
+    content_hash: str
+    tokens: int
+
+
+class SectionRegistry:
+    """
+    Content-hash keyed registry of shared ContextSection objects.
+    
+    Sessions that add the same system prompt or tool definitions receive
+    the same ContextSection instance, so the content is stored and
+    token-counted once per process. Entries are held weakly and disappear
+    once no builder references them.
+    """
+    
+    def __init__(self, token_counter: Callable[[str], int] = None,
+                 batch_token_counter: Callable[[List[str]], List[int]] = None):
+        self.token_counter = token_counter or estimate_token_count
+        self.batch_token_counter = batch_token_counter
+        self._sections: "weakref.WeakValueDictionary[str, ContextSection]" = (
+            weakref.WeakValueDictionary()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def intern(self, content: str) -> ContextSection:
+        """Return the shared section for content, creating it if needed."""
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        with self._lock:
+            section = self._sections.get(content_hash)
+            if section is not None:
+                self.hits += 1
+                return section
+        
+        # Count tokens outside the lock; a concurrent duplicate is resolved below
+        section = ContextSection(
+            content=content,
+            content_hash=content_hash,
+            tokens=self.token_counter(content)
+        )
+        with self._lock:
+            existing = self._sections.get(content_hash)
+            if existing is not None:
+                self.hits += 1
+                return existing
+            self._sections[content_hash] = section
+            self.misses += 1
+            return section
+    
+    def intern_many(self, contents: List[str]) -> List[ContextSection]:
+        """
+        Intern a batch of contents with one token-counting call for all misses.
+        
+        Uses batch_token_counter when configured (e.g. a tokenizer's batch
+        encode), otherwise token_counter per item.
+        """
+        hashes = [hashlib.sha256(c.encode()).hexdigest() for c in contents]
+        results: List[Optional[ContextSection]] = [None] * len(contents)
+        missing: Dict[str, int] = {}
+        with self._lock:
+            for i, content_hash in enumerate(hashes):
+                section = self._sections.get(content_hash)
+                if section is not None:
+                    results[i] = section
+                    self.hits += 1
+                elif content_hash not in missing:
+                    missing[content_hash] = i
+        
+        if missing:
+            to_count = [contents[i] for i in missing.values()]
+            if self.batch_token_counter is not None:
+                counts = self.batch_token_counter(to_count)
+            else:
+                counts = [self.token_counter(c) for c in to_count]
+            with self._lock:
+                for (content_hash, i), tokens in zip(missing.items(), counts):
+                    section = self._sections.get(content_hash)
+                    if section is None:
+                        section = ContextSection(contents[i], content_hash, tokens)
+                        self._sections[content_hash] = section
+                        self.misses += 1
+                    results[i] = section
+        
+        for i, content_hash in enumerate(hashes):
+            if results[i] is None:
+                results[i] = results[missing[content_hash]]
+        return results
+    
+    def lookup_many(self, contents: List[str]) -> List[Optional[ContextSection]]:
+        """Return the already-interned section for each content, or None; never counts."""
+        hashes = [hashlib.sha256(c.encode()).hexdigest() for c in contents]
+        with self._lock:
+            return [self._sections.get(content_hash) for content_hash in hashes]
+    
+    def get_stats(self) -> Dict:
+        """Get registry size and hit statistics."""
+        with self._lock:
+            return {
+                "sections": len(self._sections),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+_default_registry = SectionRegistry()
+
+
+def get_section_registry() -> SectionRegistry:
+    """Get the process-wide section registry shared by ContextBuilders."""
+    return _default_registry
+
+
 # Context Builder
 
 class ContextBuilder:
     """Build context with budget management."""
     
-    def __init__(self, context_limit: int = 100000):
+    def __init__(self, context_limit: int = 100000,
+                 registry: SectionRegistry = None):
         self.context_limit = context_limit
-        self.sections: Dict[str, str] = {}
+        self.registry = registry or _default_registry
+        self.sections: Dict[str, Dict] = {}
         self.order: List[str] = []
     
     def add_section(self, name: str, content: str, 
                     priority: int = 0, category: str = "other"):
         """Add section to context."""
+        self.add_interned_section(name, self.registry.intern(content),
+                                  priority, category)
+    
+    def add_interned_section(self, name: str, section: ContextSection,
+                             priority: int = 0, category: str = "other"):
+        """Add an already interned section without re-hashing or counting."""
         if name not in self.sections:
             self.order.append(name)
         
         self.sections[name] = {
-            "content": content,
+            "content": section.content,
             "priority": priority,
             "category": category,
-            "tokens": estimate_token_count(content)
+            "tokens": section.tokens,
+            "section": section
         }
     
     def build(self, max_tokens: int = None) -> str:
@@ -232,7 +369,176 @@ def truncate_messages(messages: list, max_tokens: int) -> list:
 
 # Context Validation
 
-def validate_context_structure(context: Dict) -> Dict:
+_WORD_PATTERN = re.compile(r'\S+')
+_HASH_MOD = (1 << 61) - 1
+_HASH_BASE = 1_000_003
+_MASK64 = (1 << 64) - 1
+_LANE_BITS = 32
+# _SPREAD[j][byte] places bit b of byte j into its own 32-bit counter lane, so
+# adding spread fingerprints tallies all 64 SimHash bit votes at once
+_SPREAD = [
+    [sum(1 << ((j * 8 + b) * _LANE_BITS) for b in range(8) if byte >> b & 1)
+     for byte in range(256)]
+    for j in range(8)
+]
+
+
+def _mix64(value: int) -> int:
+    """Spread fingerprint bits (splitmix64 finalizer) before SimHash voting."""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & _MASK64
+    return value ^ (value >> 31)
+
+
+def _flatten_sections(context: Dict) -> List[Tuple[str, str]]:
+    """Expand a context dict into (name, text) pairs, one per document."""
+    flat = []
+    for section, content in context.items():
+        if isinstance(content, (list, tuple)) and section == "documents":
+            for i, doc in enumerate(content):
+                flat.append((f"{section}[{i}]", str(doc)))
+        else:
+            flat.append((section, str(content)))
+    return flat
+
+
+def detect_near_duplicates(sections: List[Tuple[str, str]], shingle_size: int = 8,
+                           max_hamming: int = 6) -> Dict:
+    """
+    Find duplicated spans and near-duplicate sections in one streaming pass.
+    
+    Each section is scanned word by word; a rolling hash over the last
+    shingle_size words is looked up in a shared index to find spans already
+    seen earlier (in another section or earlier in the same one). Adjacent
+    matches are merged into spans. A 64-bit SimHash over every shingle is
+    bucketed by eight 8-bit bands to find sections within max_hamming
+    (at most 7) bits of each other without comparing every pair.
+    
+    Sections shorter than shingle_size words are hashed whole, so exact
+    duplicates of short sections are still reported.
+    
+    Runs in O(total words) time and memory.
+    """
+    first_seen: Dict[int, Tuple[int, int]] = {}
+    short_seen: Dict[int, int] = {}
+    base_pow = pow(_HASH_BASE, shingle_size - 1, _HASH_MOD)
+    names = [name for name, _ in sections]
+    spans = []
+    section_stats = []
+    simhashes = []
+    
+    for index, (name, text) in enumerate(sections):
+        window = deque()  # (start, end, word_hash) for the last shingle_size words
+        fingerprint = 0
+        bit_counts = 0
+        shingles = 0
+        duplicate_chars = 0
+        run = None  # [start_char, end_char, duplicate_of]
+        position = 0
+        
+        for match in _WORD_PATTERN.finditer(text):
+            word_hash = zlib.crc32(match.group().encode())
+            if len(window) == shingle_size:
+                fingerprint = (fingerprint - window.popleft()[2] * base_pow) % _HASH_MOD
+            fingerprint = (fingerprint * _HASH_BASE + word_hash) % _HASH_MOD
+            window.append((match.start(), match.end(), word_hash))
+            if len(window) < shingle_size:
+                continue
+            
+            shingle_start = window[0][0]
+            seen = first_seen.get(fingerprint)
+            if seen is None:
+                first_seen[fingerprint] = (index, position)
+            elif seen[0] != index or position - seen[1] >= shingle_size:
+                if run is not None and shingle_start <= run[1]:
+                    run[1] = match.end()
+                else:
+                    if run is not None:
+                        spans.append({"section": name, "start": run[0],
+                                      "end": run[1], "duplicate_of": run[2]})
+                        duplicate_chars += run[1] - run[0]
+                    run = [shingle_start, match.end(), names[seen[0]]]
+            position += 1
+            
+            mixed = _mix64(fingerprint)
+            for j in range(8):
+                bit_counts += _SPREAD[j][mixed >> (j * 8) & 0xFF]
+            shingles += 1
+        
+        if window and shingles == 0:
+            # Too short for a full shingle: the whole section is one shingle
+            seen = short_seen.setdefault(fingerprint, index)
+            if seen != index:
+                run = [window[0][0], window[-1][1], names[seen]]
+            mixed = _mix64(fingerprint)
+            for j in range(8):
+                bit_counts += _SPREAD[j][mixed >> (j * 8) & 0xFF]
+            shingles = 1
+        
+        if run is not None:
+            spans.append({"section": name, "start": run[0],
+                          "end": run[1], "duplicate_of": run[2]})
+            duplicate_chars += run[1] - run[0]
+        
+        lane_mask = (1 << _LANE_BITS) - 1
+        simhash = sum(
+            1 << bit for bit in range(64)
+            if 2 * (bit_counts >> (bit * _LANE_BITS) & lane_mask) > shingles
+        )
+        simhashes.append(simhash if shingles else None)
+        section_stats.append({
+            "section": name,
+            "tokens": estimate_token_count(text),
+            "duplicate_tokens": duplicate_chars // 4,
+            "duplicate_ratio": duplicate_chars / len(text) if text else 0.0
+        })
+    
+    near_duplicates = []
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    reported = set()
+    for index, simhash in enumerate(simhashes):
+        if simhash is None:
+            continue
+        for band in range(8):
+            key = (band, simhash >> (band * 8) & 0xFF)
+            for other in buckets.get(key, []):
+                distance = bin(simhash ^ simhashes[other]).count("1")
+                if distance <= max_hamming and (other, index) not in reported:
+                    reported.add((other, index))
+                    near_duplicates.append({
+                        "section": names[index],
+                        "similar_to": names[other],
+                        "hamming_distance": distance
+                    })
+            buckets.setdefault(key, []).append(index)
+    
+    for span in spans:
+        span["tokens"] = (span["end"] - span["start"]) // 4
+    
+    return {
+        "spans": spans,
+        "near_duplicates": near_duplicates,
+        "sections": section_stats,
+        "recoverable_tokens": sum(s["duplicate_tokens"] for s in section_stats)
+    }
+
+
+def deduplicate_documents(documents: List[str], max_duplicate_ratio: float = 0.5,
+                          shingle_size: int = 8) -> List[str]:
+    """Drop retrieved documents largely duplicated by earlier documents."""
+    report = detect_near_duplicates(
+        [(str(i), doc) for i, doc in enumerate(documents)],
+        shingle_size=shingle_size
+    )
+    dropped = {
+        int(stats["section"]) for stats in report["sections"]
+        if stats["duplicate_ratio"] >= max_duplicate_ratio
+    }
+    dropped.update(int(pair["section"]) for pair in report["near_duplicates"])
+    return [doc for i, doc in enumerate(documents) if i not in dropped]
+
+
+def validate_context_structure(context: Dict, max_duplicate_ratio: float = 0.5) -> Dict:
     """
     Validate context structure for common issues.
     
@@ -247,8 +553,12 @@ def validate_context_structure(context: Dict) -> Dict:
             issues.append(f"Empty {section} section")
             recommendations.append(f"Remove or populate {section}")
     
+    # Check for duplicate information across the full content of every
+    # section and document; token counts come from the same pass
+    duplicates = detect_near_duplicates(_flatten_sections(context))
+    
     # Check for excessive length
-    total_tokens = sum(estimate_token_count(str(c)) for c in context.values())
+    total_tokens = sum(s["tokens"] for s in duplicates["sections"])
     if total_tokens > 80000:
         issues.append(f"Context length ({total_tokens} tokens) exceeds recommended limit")
         recommendations.append("Consider context compaction or partitioning")
@@ -260,74 +570,512 @@ def validate_context_structure(context: Dict) -> Dict:
             issues.append(f"Missing recommended section: {section}")
             recommendations.append(f"Add {section} section with relevant information")
     
-    # Check for duplicate information
-    # Using hashlib instead of hash() for cross-process consistency
-    seen_content = set()
-    for section, content in context.items():
-        content_str = str(content)[:1000]  # First 1000 chars
-        content_hash = hashlib.md5(content_str.encode()).hexdigest()
-        if content_hash in seen_content:
-            issues.append(f"Potential duplicate content in {section}")
-        seen_content.add(content_hash)
+    flagged = [
+        s["section"] for s in duplicates["sections"]
+        if s["duplicate_ratio"] >= max_duplicate_ratio
+    ]
+    flagged.extend(
+        pair["section"] for pair in duplicates["near_duplicates"]
+        if pair["section"] not in flagged
+    )
+    for section in flagged:
+        issues.append(f"Potential duplicate content in {section}")
+    if duplicates["recoverable_tokens"] > 0:
+        recommendations.append(
+            f"Deduplicate overlapping content to recover "
+            f"~{duplicates['recoverable_tokens']} tokens"
+        )
     
     return {
         "valid": len(issues) == 0,
         "issues": issues,
-        "recommendations": recommendations
+        "recommendations": recommendations,
+        "duplicates": duplicates
     }
 
 
 # Progressive Disclosure
 
+class _MappedFile:
+    """Memory-mapped view of a large file with a lazily built header index."""
+    
+    def __init__(self, path: str, stat_key: Tuple[int, int]):
+        self.path = path
+        self.stat_key = stat_key
+        self._file = open(path, 'rb')
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._headers: Optional[List[Tuple[int, str, int]]] = None
+    
+    def headers(self) -> List[Tuple[int, str, int]]:
+        """Return (level, title, offset) for every markdown header line."""
+        if self._headers is None:
+            headers = []
+            pos = 0 if self.mm[:1] == b'#' else self.mm.find(b'\n#')
+            while pos != -1:
+                line_start = pos if pos == 0 and self.mm[:1] == b'#' else pos + 1
+                line_end = self.mm.find(b'\n', line_start)
+                if line_end == -1:
+                    line_end = len(self.mm)
+                line = self.mm[line_start:line_end].decode('utf-8', errors='replace')
+                level = len(line) - len(line.lstrip('#'))
+                headers.append((level, line.lstrip('#').strip(), line_start))
+                pos = self.mm.find(b'\n#', line_end)
+            self._headers = headers
+        return self._headers
+    
+    def read_section(self, title: str) -> str:
+        """Read one section (header through next header of same or higher level)."""
+        headers = self.headers()
+        for i, (level, header, offset) in enumerate(headers):
+            if header != title:
+                continue
+            end = len(self.mm)
+            for next_level, _, next_offset in headers[i + 1:]:
+                if next_level <= level:
+                    end = next_offset
+                    break
+            return self.mm[offset:end].decode('utf-8', errors='replace')
+        return ""
+    
+    def read_all(self) -> str:
+        return self.mm[:].decode('utf-8', errors='replace')
+    
+    def close(self):
+        self.mm.close()
+        self._file.close()
+
+
 class ProgressiveDisclosureManager:
-    """Manage progressive disclosure of context."""
+    """
+    Manage progressive disclosure of context.
+    
+    Loaded files are kept in an LRU cache bounded by max_cache_bytes and
+    revalidated against the file's mtime and size on every access. Files
+    larger than mmap_threshold are memory-mapped so that individual
+    sections can be read without loading the whole file; at most
+    max_mapped_files maps (each holding a file descriptor) are kept open,
+    least recently used first out.
+    """
     
-    def __init__(self, base_dir: str = "."):
+    def __init__(self, base_dir: str = ".", max_cache_bytes: int = 8 * 1024 * 1024,
+                 mmap_threshold: int = 1024 * 1024, prefetch_workers: int = 2,
+                 max_mapped_files: int = 64):
         self.base_dir = base_dir
-        self.loaded_files: Dict[str, str] = {}
+        self.max_cache_bytes = max_cache_bytes
+        self.mmap_threshold = mmap_threshold
+        self.prefetch_workers = prefetch_workers
+        self.max_mapped_files = max_mapped_files
+        self.loaded_files: "OrderedDict[str, str]" = OrderedDict()
+        self.cached_bytes = 0
+        self._file_stats: Dict[str, Tuple[int, int]] = {}
+        self._mapped: "OrderedDict[str, _MappedFile]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
     
     def load_summary(self, summary_path: str) -> str:
         """Load summary without loading full content."""
-        if summary_path in self.loaded_files:
-            return self.loaded_files[summary_path]
-        
-        try:
-            with open(summary_path, 'r') as f:
-                content = f.read()
-            self.loaded_files[summary_path] = content
-            return content
-        except FileNotFoundError:
-            return ""
+        return self._load(summary_path)
     
-    def load_detail(self, detail_path: str, force: bool = False) -> str:
-        """Load detailed content on demand."""
-        if not force and detail_path in self.loaded_files:
-            return self.loaded_files[detail_path]
+    def load_detail(self, detail_path: str, force: bool = False,
+                    section: str = None) -> str:
+        """
+        Load detailed content on demand.
         
-        try:
-            with open(detail_path, 'r') as f:
-                content = f.read()
-            self.loaded_files[detail_path] = content
-            return content
-        except FileNotFoundError:
-            return ""
+        If section is given, only that header's section is returned; for
+        memory-mapped files the rest of the file is never read.
+        """
+        if force:
+            self.invalidate(detail_path)
+        
+        if section is None:
+            return self._load(detail_path)
+        
+        mapped = self._get_mapped(detail_path)
+        if mapped is not None:
+            return mapped.read_section(section)
+        
+        content = self._load(detail_path)
+        return _extract_section(content, section)
     
     def get_contextual_info(self, reference: Dict) -> str:
         """
         Get information following progressive disclosure.
         
-        Returns summary if available, loads detail if needed.
+        Returns summary if available, loads detail if needed. When only the
+        summary is returned, the detail file and any paths listed under
+        "related" are prefetched in the background since they are the most
+        likely next requests.
         """
         summary_path = reference.get("summary_path")
         detail_path = reference.get("detail_path")
         need_detail = reference.get("need_detail", False)
         
         if need_detail and detail_path:
-            return self.load_detail(detail_path)
+            result = self.load_detail(detail_path, section=reference.get("section"))
         elif summary_path:
-            return self.load_summary(summary_path)
+            result = self.load_summary(summary_path)
+            if detail_path:
+                self.prefetch([detail_path])
         else:
+            result = ""
+        
+        related = reference.get("related")
+        if related:
+            self.prefetch(related)
+        
+        return result
+    
+    def prefetch(self, paths: List[str]) -> List[Future]:
+        """
+        Warm the cache for paths on a background thread pool.
+        
+        Small files are read into the cache; large ones are only mapped and
+        their header index built, so prefetching never decodes them.
+        """
+        futures = []
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.prefetch_workers,
+                    thread_name_prefix="disclosure-prefetch"
+                )
+            for path in paths:
+                if path in self._pending or self._is_fresh(path):
+                    continue
+                future = self._executor.submit(self._warm, path)
+                self._pending[path] = future
+                future.add_done_callback(
+                    lambda _f, p=path: self._pending.pop(p, None)
+                )
+                futures.append(future)
+        return futures
+    
+    def invalidate(self, path: str):
+        """
+        Drop any cached or mapped state for path.
+        
+        The map is not closed here since another thread may still be reading
+        it; it is released with its last reference.
+        """
+        with self._lock:
+            self._evict(path)
+            self._mapped.pop(path, None)
+    
+    def close(self):
+        """Stop prefetching and release all cached and mapped files."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for path in list(self._mapped):
+                self._mapped.pop(path).close()
+            self.loaded_files.clear()
+            self._file_stats.clear()
+            self.cached_bytes = 0
+    
+    def get_cache_stats(self) -> Dict:
+        """Get current cache occupancy."""
+        with self._lock:
+            return {
+                "cached_files": len(self.loaded_files),
+                "cached_bytes": self.cached_bytes,
+                "max_cache_bytes": self.max_cache_bytes,
+                "mapped_files": len(self._mapped),
+                "pending_prefetches": len(self._pending)
+            }
+    
+    def _load(self, path: str) -> str:
+        """Return file content, reading from disk only if the cache is stale."""
+        stat_key = _stat_key(path)
+        if stat_key is None:
+            self.invalidate(path)
             return ""
+        
+        with self._lock:
+            if self._file_stats.get(path) == stat_key:
+                self.loaded_files.move_to_end(path)
+                return self.loaded_files[path]
+        
+        if stat_key[1] > self.mmap_threshold:
+            mapped = self._get_mapped(path)
+            if mapped is None:
+                return ""
+            content = mapped.read_all()
+        else:
+            try:
+                with open(path, 'r') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                return ""
+        
+        with self._lock:
+            self._evict(path)
+            if stat_key[1] <= self.max_cache_bytes:
+                self.loaded_files[path] = content
+                self._file_stats[path] = stat_key
+                self.cached_bytes += stat_key[1]
+                while self.cached_bytes > self.max_cache_bytes:
+                    self._evict(next(iter(self.loaded_files)))
+        return content
+    
+    def _warm(self, path: str):
+        """Prefetch worker: map large files and index headers, load small ones."""
+        stat_key = _stat_key(path)
+        if stat_key is not None and stat_key[1] > self.mmap_threshold:
+            mapped = self._get_mapped(path)
+            if mapped is not None:
+                # Safe without the lock: maps are never closed while cached
+                # or replaced, and indexing the same bytes twice is harmless
+                mapped.headers()
+        else:
+            self._load(path)
+    
+    def _get_mapped(self, path: str) -> Optional[_MappedFile]:
+        """Return a current memory map for path if it is large enough to map."""
+        stat_key = _stat_key(path)
+        if stat_key is None:
+            self.invalidate(path)
+            return None
+        if stat_key[1] <= self.mmap_threshold:
+            return None
+        
+        with self._lock:
+            mapped = self._mapped.get(path)
+            if mapped is not None and mapped.stat_key == stat_key:
+                self._mapped.move_to_end(path)
+                return mapped
+            # A stale map is replaced but not closed, for the same reason as
+            # in invalidate()
+            if self._file_stats.get(path) != stat_key:
+                self._evict(path)
+            try:
+                mapped = _MappedFile(path, stat_key)
+            except FileNotFoundError:
+                self._mapped.pop(path, None)
+                return None
+            self._mapped[path] = mapped
+            self._mapped.move_to_end(path)
+            while len(self._mapped) > self.max_mapped_files:
+                # Not closed explicitly: a reader may still hold the map; it
+                # (and its descriptor) is released when the last reference goes
+                self._mapped.popitem(last=False)
+            return mapped
+    
+    def _is_fresh(self, path: str) -> bool:
+        stat_key = _stat_key(path)
+        if stat_key is None:
+            return False
+        mapped = self._mapped.get(path)
+        return self._file_stats.get(path) == stat_key or (
+            mapped is not None and mapped.stat_key == stat_key
+        )
+    
+    def _evict(self, path: str):
+        """Remove path from the LRU cache. Caller must hold the lock."""
+        if path in self.loaded_files:
+            del self.loaded_files[path]
+            self.cached_bytes -= self._file_stats.pop(path)[1]
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    """Return (mtime_ns, size) used to detect on-disk changes."""
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _extract_section(content: str, title: str) -> str:
+    """Extract a markdown section from in-memory content."""
+    lines = content.split('\n')
+    section_lines = []
+    level = None
+    for line in lines:
+        if line.startswith('#'):
+            line_level = len(line) - len(line.lstrip('#'))
+            if level is None and line.lstrip('#').strip() == title:
+                level = line_level
+            elif level is not None and line_level <= level:
+                break
+        if level is not None:
+            section_lines.append(line)
+    return '\n'.join(section_lines)
+
+
+# Async Context Assembly
+
+class AsyncContextService:
+    """
+    Assemble agent contexts concurrently from an asyncio event loop.
+    
+    File loads and validation run on a thread pool so the loop stays free.
+    Token counting for all requests submitted in the same loop iteration is
+    coalesced into one SectionRegistry.intern_many call. Each request may
+    carry a timeout; when it expires the context built so far is returned
+    with "complete" set to False. Reference loading may use at most
+    reference_budget of the timeout, leaving the rest for assembly.
+    """
+    
+    def __init__(self, disclosure: ProgressiveDisclosureManager = None,
+                 registry: SectionRegistry = None, max_workers: int = 8,
+                 context_limit: int = 80000, reference_budget: float = 0.8):
+        self.disclosure = disclosure or ProgressiveDisclosureManager()
+        self.registry = registry or _default_registry
+        self.context_limit = context_limit
+        self.reference_budget = reference_budget
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="context-assembly"
+        )
+        self._batch: List[Tuple[str, asyncio.Future]] = []
+        self._flush_scheduled = False
+    
+    async def build_context(self, task: str, system_prompt: str,
+                            documents: List[str] = None,
+                            references: List[Dict] = None,
+                            timeout: float = None) -> Dict:
+        """
+        Async counterpart of build_agent_context.
+        
+        references are resolved through ProgressiveDisclosureManager
+        .get_contextual_info and added as "reference_<i>" sections. If the
+        timeout expires while counting tokens, sections not yet in the
+        registry are left out and named in "pending_sections".
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + timeout if timeout is not None else None
+        
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - loop.time())
+        
+        complete = True
+        pending_references = []
+        
+        # Load referenced files concurrently
+        loaded: Dict[int, str] = {}
+        if references:
+            tasks = {
+                loop.run_in_executor(
+                    self.executor, self.disclosure.get_contextual_info, ref
+                ): i
+                for i, ref in enumerate(references)
+            }
+            reference_timeout = None if timeout is None else timeout * self.reference_budget
+            done, pending = await asyncio.wait(tasks, timeout=reference_timeout)
+            for future in done:
+                if future.exception() is None and future.result():
+                    loaded[tasks[future]] = future.result()
+            for future in pending:
+                future.cancel()
+                pending_references.append(tasks[future])
+                complete = False
+        
+        # Batched token counting for every section of this request
+        entries = [("system", system_prompt, 10, "system"),
+                   ("task", task, 9, "task")]
+        for i, doc in enumerate(documents or []):
+            entries.append((f"document_{i}", doc, 5, "retrieved"))
+        for i in sorted(loaded):
+            entries.append((f"reference_{i}", loaded[i], 4, "reference"))
+        
+        builder = ContextBuilder(context_limit=self.context_limit,
+                                 registry=self.registry)
+        interning = asyncio.ensure_future(self._intern([e[1] for e in entries]))
+        try:
+            sections = await asyncio.wait_for(asyncio.shield(interning), remaining())
+        except asyncio.TimeoutError:
+            # Out of time: keep every section the registry already holds and
+            # leave the rest to the batch still counting in the background;
+            # counting them here would block the event loop
+            complete = False
+            if interning.done() and interning.exception() is None:
+                sections = interning.result()
+            else:
+                sections = self.registry.lookup_many([e[1] for e in entries])
+        
+        pending_sections = []
+        for (name, _, priority, category), section in zip(entries, sections):
+            if section is None:
+                pending_sections.append(name)
+            else:
+                builder.add_interned_section(name, section, priority, category)
+        
+        context = {
+            "system": system_prompt,
+            "task": task,
+            "documents": documents or []
+        }
+        validation = None
+        if complete:
+            try:
+                validation = await asyncio.wait_for(
+                    loop.run_in_executor(
+                        self.executor, validate_context_structure, context
+                    ),
+                    remaining()
+                )
+            except asyncio.TimeoutError:
+                complete = False
+        
+        return {
+            "context": builder.build(),
+            "usage_report": builder.get_usage_report(),
+            "validation": validation,
+            "complete": complete,
+            "pending_references": sorted(pending_references),
+            "pending_sections": pending_sections,
+            "elapsed": loop.time() - started
+        }
+    
+    async def build_many(self, requests: List[Dict],
+                         timeout: float = None) -> List[Dict]:
+        """Build contexts for many sessions concurrently, preserving order."""
+        return await asyncio.gather(*(
+            self.build_context(timeout=request.get("timeout", timeout),
+                               **{k: v for k, v in request.items() if k != "timeout"})
+            for request in requests
+        ))
+    
+    def close(self):
+        """Shut down the worker pool."""
+        self.executor.shutdown(wait=False)
+    
+    async def _intern(self, contents: List[str]) -> List[ContextSection]:
+        """Queue contents for the next coalesced token-counting batch."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for content in contents:
+            future = loop.create_future()
+            self._batch.append((content, future))
+            futures.append(future)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return list(await asyncio.gather(*futures))
+    
+    def _flush(self):
+        """Count every queued content in one executor call."""
+        batch, self._batch = self._batch, []
+        self._flush_scheduled = False
+        loop = asyncio.get_running_loop()
+        job = loop.run_in_executor(
+            self.executor, self.registry.intern_many, [c for c, _ in batch]
+        )
+        
+        def resolve(done: asyncio.Future):
+            error = done.exception()
+            results = done.result() if error is None else [None] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+        
+        job.add_done_callback(resolve)
 
 
 # Usage Example